@@ -0,0 +1,33 @@
+from datetime import datetime
+from src.models.user import db
+
+class ArchiveIndex(db.Model):
+    __tablename__ = 'archive_index'
+    __table_args__ = (db.UniqueConstraint('lead_id', 'table_name', 'partition'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    lead_id = db.Column(db.Integer, nullable=False, index=True)  # no FK: the lead itself may be archived
+    table_name = db.Column(db.String(20), nullable=False)  # leads, calls, follow_ups
+    partition = db.Column(db.String(7), nullable=False)  # YYYY-MM
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class ArchivePartition(db.Model):
+    __tablename__ = 'archive_partitions'
+    __table_args__ = (db.UniqueConstraint('table_name', 'partition'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    table_name = db.Column(db.String(20), nullable=False)
+    partition = db.Column(db.String(7), nullable=False)  # YYYY-MM
+    row_count = db.Column(db.Integer, default=0)
+    stats = db.Column(db.JSON, nullable=False, default=dict)  # running aggregates used by the dashboard
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'table_name': self.table_name,
+            'partition': self.partition,
+            'row_count': self.row_count,
+            'stats': self.stats,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
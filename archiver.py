@@ -0,0 +1,263 @@
+from flask import current_app
+from src.models.archive import ArchiveIndex, ArchivePartition
+from src.models.lead import Lead, Call, FollowUp, db
+from src.services.job_queue import job_queue
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+import gzip
+import json
+import os
+
+CLOSED_LEAD_STATUSES = ("lost", "converted")
+
+def archive_dir():
+    return current_app.config["ARCHIVE_DIR"]
+
+def partition_path(table_name, partition):
+    return os.path.join(archive_dir(), table_name, f"{partition}.ndjson.gz")
+
+def partition_for(*timestamps):
+    """YYYY-MM of the first timestamp that is set"""
+    for timestamp in timestamps:
+        if timestamp:
+            return timestamp.strftime("%Y-%m")
+    return datetime.utcnow().strftime("%Y-%m")
+
+def row_to_record(row):
+    record = {}
+    for column in row.__table__.columns:
+        value = getattr(row, column.name)
+        record[column.name] = value.isoformat() if isinstance(value, datetime) else value
+    return record
+
+def append_records(table_name, partition, records):
+    """Append records to a partition file and fsync before returning.
+
+    Each append adds a new gzip member; gzip readers treat the concatenation
+    as one stream, so partitions never need rewriting.
+    """
+    path = partition_path(table_name, partition)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "ab") as raw:
+        with gzip.GzipFile(fileobj=raw, mode="ab") as archive:
+            for record in records:
+                archive.write((json.dumps(record) + "\n").encode("utf-8"))
+        raw.flush()
+        os.fsync(raw.fileno())
+
+def read_records(table_name, partition, lead_id=None):
+    """Records of one partition (optionally for one lead), de-duplicated by id.
+
+    A run interrupted between writing the archive and deleting the hot rows
+    archives those rows again next time, so the last copy of an id wins.
+    """
+    path = partition_path(table_name, partition)
+    if not os.path.exists(path):
+        return []
+
+    key = "id" if table_name == "leads" else "lead_id"
+    records = {}
+    with gzip.open(path, "rt", encoding="utf-8") as archive:
+        for line in archive:
+            record = json.loads(line)
+            if lead_id is None or record.get(key) == lead_id:
+                records[record["id"]] = record
+    return list(records.values())
+
+def max_archived_id(table_name):
+    """Highest row id in any partition of a table (0 if nothing is archived); reads every partition"""
+    directory = os.path.join(archive_dir(), table_name)
+    if not os.path.isdir(directory):
+        return 0
+    max_id = 0
+    for filename in os.listdir(directory):
+        if filename.endswith(".ndjson.gz"):
+            partition = filename[:-len(".ndjson.gz")]
+            max_id = max([max_id] + [record["id"] for record in read_records(table_name, partition)])
+    return max_id
+
+def read_lead_archive(lead_id):
+    """Archived lead record (or None) and archived calls for a lead, using the archive index"""
+    entries = ArchiveIndex.query.filter_by(lead_id=lead_id).all()
+    lead = None
+    calls = []
+    for entry in entries:
+        if entry.table_name == "leads":
+            found = read_records("leads", entry.partition, lead_id)
+            lead = found[0] if found else lead
+        elif entry.table_name == "calls":
+            calls.extend(read_records("calls", entry.partition, lead_id))
+    calls.sort(key=lambda call: call["created_at"] or "")
+    return lead, calls
+
+def reassign_archived_rows(from_lead_ids, to_lead_id):
+    """Point archived calls and follow-ups of merged leads at the lead they were merged into.
+
+    Partitions are append-only, so re-labelled copies of the rows are appended
+    (the last copy of an id wins when reading) and the archive index entries
+    move to ``to_lead_id``. Partition aggregates are unchanged since no row is
+    added. The caller commits. Returns the number of rows reassigned.
+    """
+    entries = ArchiveIndex.query.filter(
+        ArchiveIndex.lead_id.in_(from_lead_ids),
+        ArchiveIndex.table_name != "leads"
+    ).all()
+    if not entries:
+        return 0
+
+    indexed = {
+        (entry.table_name, entry.partition)
+        for entry in ArchiveIndex.query.filter_by(lead_id=to_lead_id)
+    }
+    lead_ids_by_partition = defaultdict(set)
+    for entry in entries:
+        lead_ids_by_partition[(entry.table_name, entry.partition)].add(entry.lead_id)
+
+    reassigned = 0
+    for (table_name, partition), lead_ids in lead_ids_by_partition.items():
+        records = [
+            dict(record, lead_id=to_lead_id)
+            for record in read_records(table_name, partition)
+            if record["lead_id"] in lead_ids
+        ]
+        if records:
+            append_records(table_name, partition, records)
+            reassigned += len(records)
+        if (table_name, partition) not in indexed:
+            db.session.add(ArchiveIndex(lead_id=to_lead_id, table_name=table_name, partition=partition))
+
+    for entry in entries:
+        db.session.delete(entry)
+    return reassigned
+
+def merge_counts(stats, name, values):
+    # Counts are stored as [key, count] pairs so a None key (e.g. no outcome) survives JSON
+    counts = Counter({key: count for key, count in stats.get(name, [])})
+    counts.update(values)
+    stats[name] = [[key, count] for key, count in counts.items()]
+
+def summarize(table_name, records):
+    if table_name == "leads":
+        return {"by_status": Counter(record["status"] for record in records)}
+    if table_name == "calls":
+        durations = [record["duration"] for record in records if record["duration"] and record["duration"] > 0]
+        return {
+            "by_outcome": Counter(record["outcome"] for record in records),
+            "duration_sum": sum(durations),
+            "duration_count": len(durations)
+        }
+    return {}
+
+def write_partitions(grouped):
+    """Append grouped records to their partitions and update the hot-side index and aggregates"""
+    for (table_name, partition), records in grouped.items():
+        append_records(table_name, partition, records)
+
+        summary = ArchivePartition.query.filter_by(table_name=table_name, partition=partition).first()
+        if summary is None:
+            summary = ArchivePartition(table_name=table_name, partition=partition, row_count=0, stats={})
+            db.session.add(summary)
+
+        stats = dict(summary.stats or {})
+        for name, value in summarize(table_name, records).items():
+            if isinstance(value, Counter):
+                merge_counts(stats, name, value)
+            else:
+                stats[name] = stats.get(name, 0) + value
+        summary.stats = stats
+        summary.row_count = (summary.row_count or 0) + len(records)
+
+        lead_key = "id" if table_name == "leads" else "lead_id"
+        lead_ids = {record[lead_key] for record in records}
+        indexed = {
+            lead_id for (lead_id,) in db.session.query(ArchiveIndex.lead_id).filter(
+                ArchiveIndex.table_name == table_name,
+                ArchiveIndex.partition == partition,
+                ArchiveIndex.lead_id.in_(lead_ids)
+            )
+        }
+        db.session.add_all([
+            ArchiveIndex(lead_id=lead_id, table_name=table_name, partition=partition)
+            for lead_id in lead_ids - indexed
+        ])
+
+def archive_batch(leads, calls):
+    """Move one batch of cold leads (with all their calls) and cold calls to the archive"""
+    calls = list(calls) + [call for lead in leads for call in lead.calls]
+    call_ids = [call.id for call in calls]
+    follow_ups = FollowUp.query.filter(FollowUp.call_id.in_(call_ids)).all() if call_ids else []
+
+    grouped = defaultdict(list)
+    for lead in leads:
+        grouped[("leads", partition_for(lead.updated_at, lead.created_at))].append(row_to_record(lead))
+    for call in calls:
+        grouped[("calls", partition_for(call.completed_at, call.created_at))].append(row_to_record(call))
+    for follow_up in follow_ups:
+        grouped[("follow_ups", partition_for(follow_up.created_at))].append(row_to_record(follow_up))
+
+    # Archive files are durable before any hot row is deleted
+    write_partitions(grouped)
+
+    if follow_ups:
+        FollowUp.query.filter(FollowUp.id.in_([follow_up.id for follow_up in follow_ups])).delete(synchronize_session=False)
+    if call_ids:
+        Call.query.filter(Call.id.in_(call_ids)).delete(synchronize_session=False)
+    if leads:
+        Lead.query.filter(Lead.id.in_([lead.id for lead in leads])).delete(synchronize_session=False)
+    db.session.commit()
+    db.session.expunge_all()
+
+    return {"leads": len(leads), "calls": len(calls), "follow_ups": len(follow_ups)}
+
+@job_queue.task("archive.cold_rows", max_attempts=1)
+def archive_cold_rows(older_than_days=90, batch_size=500):
+    """Move closed leads and completed calls older than ``older_than_days`` to the archive.
+
+    Closed (lost/converted) leads not updated since the cutoff are archived
+    with all their calls; completed calls of other leads are archived on their
+    own once they are past the cutoff. Work is done in batches of
+    ``batch_size``. Returns the number of rows moved.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    totals = Counter()
+
+    while True:
+        leads = Lead.query.options(db.selectinload(Lead.calls)).filter(
+            Lead.status.in_(CLOSED_LEAD_STATUSES),
+            Lead.updated_at < cutoff
+        ).order_by(Lead.id).limit(batch_size).all()
+        if not leads:
+            break
+        totals.update(archive_batch(leads, []))
+
+    while True:
+        calls = Call.query.filter(
+            Call.status == "completed",
+            Call.completed_at < cutoff
+        ).order_by(Call.id).limit(batch_size).all()
+        if not calls:
+            break
+        totals.update(archive_batch([], calls))
+
+    return {"leads": totals["leads"], "calls": totals["calls"], "follow_ups": totals["follow_ups"]}
+
+def archived_totals():
+    """Aggregates over every archived partition, for read-through analytics"""
+    leads_by_status = Counter()
+    calls_by_outcome = Counter()
+    totals = {"leads": 0, "calls": 0, "duration_sum": 0, "duration_count": 0}
+
+    for summary in ArchivePartition.query.filter(ArchivePartition.table_name.in_(["leads", "calls"])).all():
+        stats = summary.stats or {}
+        if summary.table_name == "leads":
+            totals["leads"] += summary.row_count
+            leads_by_status.update({key: count for key, count in stats.get("by_status", [])})
+        else:
+            totals["calls"] += summary.row_count
+            calls_by_outcome.update({key: count for key, count in stats.get("by_outcome", [])})
+            totals["duration_sum"] += stats.get("duration_sum", 0)
+            totals["duration_count"] += stats.get("duration_count", 0)
+
+    totals["leads_by_status"] = leads_by_status
+    totals["calls_by_outcome"] = calls_by_outcome
+    return totals
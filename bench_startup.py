@@ -0,0 +1,68 @@
+"""Import-time benchmark for worker cold start.
+
+Spawns fresh interpreters that import the app (and, for comparison, single
+route modules) under ``python -X importtime``, then reports the median wall
+time, the slowest imports by cumulative time, and whether any heavy SDK was
+loaded eagerly.
+
+    python src/bench_startup.py [--runs 5] [--top 15]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TARGETS = ["src.main", "src.routes.leads", "src.routes.voice_agent"]
+
+# SDKs that must only be imported on first use
+HEAVY_MODULES = ["openai", "twilio", "requests"]
+
+def profile_import(module):
+    """Import a module in a fresh interpreter; returns (wall ms, {package: cumulative us})"""
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, env=env, capture_output=True, text=True
+    )
+    wall_ms = (time.perf_counter() - started) * 1000
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, package = line.split(":", 1)[1].split("|")
+        # Nested imports are indented by two spaces per level after the separator's space
+        cumulative[package[1:].rstrip()] = int(cumulative_us)
+    return wall_ms, cumulative
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    for module in TARGETS:
+        timings = []
+        for _ in range(args.runs):
+            wall_ms, cumulative = profile_import(module)
+            timings.append(wall_ms)
+
+        print(f"\n== import {module}: median {statistics.median(timings):.0f} ms "
+              f"(min {min(timings):.0f}, max {max(timings):.0f}, {args.runs} runs, includes interpreter start)")
+
+        # Slowest imports at any depth, indented as in the import tree (cumulative times overlap)
+        for package, us in sorted(cumulative.items(), key=lambda item: -item[1])[:args.top]:
+            print(f"  {us / 1000:8.1f} ms  {package}")
+
+        loaded = sorted({package.strip().split(".")[0] for package in cumulative} & set(HEAVY_MODULES))
+        print(f"  heavy SDKs imported eagerly: {', '.join(loaded) if loaded else 'none'}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+from src.models.lead import Lead, Call, FollowUp, db
+from src.services.archiver import reassign_archived_rows
+from src.services.job_queue import job_queue
+from src.services.phone import normalize_phone
+from collections import defaultdict
+from datetime import datetime
+from difflib import SequenceMatcher
+import re
+
+# Shared mailbox providers say nothing about whether two leads are the same business
+FREE_EMAIL_DOMAINS = {
+    "gmail.com", "googlemail.com", "yahoo.com", "hotmail.com", "outlook.com", "live.com",
+    "aol.com", "icloud.com", "me.com", "msn.com", "proton.me", "protonmail.com", "gmx.com"
+}
+
+COMPANY_STOPWORDS = {
+    "the", "and", "of", "inc", "llc", "ltd", "co", "corp", "corporation", "company",
+    "group", "holdings", "services", "solutions", "international"
+}
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Clusters returned per page; results are stored on the job row, so they are never unbounded
+DUPLICATES_PAGE_SIZE = 100
+MAX_DUPLICATES_PAGE_SIZE = 1000
+
+class LeadRecord:
+    """The fields of a lead that matching needs, normalized once up front"""
+    __slots__ = ("id", "name", "phone", "email", "domain", "company_tokens")
+
+    def __init__(self, id, name, phone, email, company):
+        self.id = id
+        self.name = " ".join(TOKEN_RE.findall((name or "").lower()))
+        self.phone = phone
+        self.email = (email or "").strip().lower() or None
+        self.domain = self.email.rpartition("@")[2] if self.email and "@" in self.email else None
+        self.company_tokens = frozenset(
+            token for token in TOKEN_RE.findall((company or "").lower())
+            if token not in COMPANY_STOPWORDS and len(token) > 1
+        )
+
+def exact_keys(record):
+    """Keys where a shared value alone means a duplicate"""
+    keys = []
+    if record.phone:
+        keys.append(("phone", record.phone))
+    if record.email:
+        keys.append(("email", record.email))
+    return keys
+
+def fuzzy_keys(record):
+    """Blocking keys that only make two leads worth comparing"""
+    keys = [("company", token) for token in record.company_tokens]
+    if record.domain and record.domain not in FREE_EMAIL_DOMAINS:
+        keys.append(("domain", record.domain))
+    return keys
+
+def similarity(a, b, floor=0.0):
+    """Score how likely two leads are the same person, from 0 to 1.
+
+    Scores below ``floor`` may be returned as a cheaper upper bound: the name
+    comparison stops at the first SequenceMatcher bound that rules the pair out.
+    """
+    if a.phone and a.phone == b.phone:
+        return 1.0
+    if a.email and a.email == b.email:
+        return 0.95
+
+    # Weighted average over the fields both leads actually have
+    total_weight = 0.0
+    partial = 0.0
+    if a.company_tokens and b.company_tokens:
+        total_weight += 0.3
+        partial += 0.3 * len(a.company_tokens & b.company_tokens) / len(a.company_tokens | b.company_tokens)
+    if a.domain and b.domain:
+        total_weight += 0.2
+        partial += 0.2 if a.domain == b.domain else 0.0
+    if a.phone and b.phone:
+        # Different numbers are weak evidence against a match: people switch between mobile and office lines
+        total_weight += 0.1
+
+    if not (a.name and b.name):
+        return partial / total_weight if total_weight else 0.0
+
+    total_weight += 0.5
+    matcher = SequenceMatcher(None, a.name, b.name)
+    for bound in (matcher.real_quick_ratio, matcher.quick_ratio, matcher.ratio):
+        score = (partial + 0.5 * bound()) / total_weight
+        if score < floor:
+            break
+    return score
+
+class DisjointSet:
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, item):
+        parent = self.parent.setdefault(item, item)
+        while parent != item:
+            grandparent = self.parent[parent]
+            self.parent[item] = grandparent
+            item, parent = parent, grandparent
+        return item
+
+    def union(self, a, b):
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a != root_b:
+            self.parent[max(root_a, root_b)] = min(root_a, root_b)
+
+def find_duplicates(threshold=0.85, max_block_size=50, limit=None):
+    """Find clusters of likely duplicate leads.
+
+    Leads are streamed once and grouped by blocking key. Leads that share a
+    normalized phone or an email are linked directly (one pass over each
+    block). Pairs are only scored inside company-token and email-domain
+    blocks, and blocks larger than ``max_block_size`` are skipped because
+    such common tokens carry no signal. Total work is therefore close to
+    linear in the number of leads.
+    """
+    records = {}
+    exact_blocks = defaultdict(list)
+    fuzzy_blocks = defaultdict(list)
+
+    rows = db.session.query(
+        Lead.id, Lead.name, Lead.phone, Lead.phone_e164, Lead.email, Lead.company
+    ).execution_options(yield_per=10000)
+
+    for lead_id, name, phone, phone_e164, email, company in rows:
+        record = LeadRecord(lead_id, name, phone_e164 or normalize_phone(phone), email, company)
+        records[lead_id] = record
+        for key in exact_keys(record):
+            exact_blocks[key].append(lead_id)
+        for key in fuzzy_keys(record):
+            fuzzy_blocks[key].append(lead_id)
+
+    clusters = DisjointSet()
+    best_scores = {}
+
+    for ids in exact_blocks.values():
+        for other_id in ids[1:]:
+            clusters.union(ids[0], other_id)
+            best_scores[(ids[0], other_id)] = 1.0
+
+    compared = set()
+    for ids in fuzzy_blocks.values():
+        if len(ids) < 2 or len(ids) > max_block_size:
+            continue
+        for i, a_id in enumerate(ids):
+            for b_id in ids[i + 1:]:
+                pair = (a_id, b_id) if a_id < b_id else (b_id, a_id)
+                if pair in compared:
+                    continue
+                compared.add(pair)
+                score = similarity(records[a_id], records[b_id], floor=threshold)
+                if score >= threshold:
+                    clusters.union(a_id, b_id)
+                    best_scores[pair] = score
+
+    groups = defaultdict(list)
+    for lead_id in clusters.parent:
+        groups[clusters.find(lead_id)].append(lead_id)
+
+    group_scores = defaultdict(float)
+    for (a_id, _), score in best_scores.items():
+        root = clusters.find(a_id)
+        group_scores[root] = max(group_scores[root], score)
+
+    results = [
+        {"lead_ids": sorted(ids), "score": round(group_scores[root], 3)}
+        for root, ids in groups.items() if len(ids) > 1
+    ]
+    results.sort(key=lambda group: (-group["score"], group["lead_ids"][0]))
+    return results[:limit] if limit else results
+
+@job_queue.task("leads.find_duplicates", max_attempts=1)
+def find_duplicate_page(threshold=0.85, max_block_size=50, limit=DUPLICATES_PAGE_SIZE, offset=0):
+    """One page of duplicate clusters (best first) with the total number found"""
+    limit = min(limit or DUPLICATES_PAGE_SIZE, MAX_DUPLICATES_PAGE_SIZE)
+    groups = find_duplicates(threshold, max_block_size)
+    return {"duplicates": groups[offset:offset + limit], "total": len(groups), "limit": limit, "offset": offset}
+
+def merge_leads(primary_id, duplicate_ids):
+    """Merge duplicate leads into a primary lead.
+
+    Calls and follow-ups are re-parented with bulk UPDATEs (archived ones
+    through the archive index), blank fields on the primary are filled from
+    the duplicates, the best score is kept, and the duplicates are deleted.
+    Returns the primary lead.
+    """
+    duplicate_ids = [lead_id for lead_id in duplicate_ids if lead_id != primary_id]
+    primary = Lead.query.get_or_404(primary_id)
+    duplicates = Lead.query.filter(Lead.id.in_(duplicate_ids)).order_by(Lead.id).all()
+    if len(duplicates) != len(set(duplicate_ids)):
+        raise ValueError("One or more duplicate leads do not exist")
+
+    for duplicate in duplicates:
+        primary.email = primary.email or duplicate.email
+        primary.company = primary.company or duplicate.company
+        primary.score = max(primary.score or 0, duplicate.score or 0)
+        if duplicate.notes:
+            primary.notes = f"{primary.notes}\n{duplicate.notes}" if primary.notes else duplicate.notes
+
+    Call.query.filter(Call.lead_id.in_(duplicate_ids)).update(
+        {Call.lead_id: primary_id}, synchronize_session=False
+    )
+    FollowUp.query.filter(FollowUp.lead_id.in_(duplicate_ids)).update(
+        {FollowUp.lead_id: primary_id}, synchronize_session=False
+    )
+    reassign_archived_rows(duplicate_ids, primary_id)
+
+    for duplicate in duplicates:
+        # Drop the stale in-memory calls list so the delete cascade can't remove re-parented calls
+        db.session.expire(duplicate, ["calls"])
+        db.session.delete(duplicate)
+
+    primary.updated_at = datetime.utcnow()
+    db.session.commit()
+    return primary
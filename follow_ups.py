@@ -0,0 +1,180 @@
+from src.models.lead import Lead, Call, SalesPlaybook, FollowUp, db
+from src.services.job_queue import job_queue
+from src.services.messaging import get_sender
+from datetime import datetime, timedelta
+import re
+
+AGENT_NAME = "Sarah"  # Could be configurable
+
+# Statuses a rerun leaves alone; pending (crashed mid-dispatch) and failed follow-ups are sent again
+FINAL_STATUSES = ("sent", "skipped")
+
+# A pending follow-up whose attempt started more recently may still be in flight
+# in an overlapping run (e.g. the nightly CLI and a bulk API job), so it is left alone
+PENDING_STALE_AFTER = timedelta(minutes=30)
+
+PLACEHOLDER_RE = re.compile(r"\{(lead_name|company|agent_name)\}")
+
+def compile_template(template):
+    """Split a template into literals and placeholder names once, so rendering is a single join"""
+    parts = PLACEHOLDER_RE.split(template)
+    literals, fields = parts[0::2], parts[1::2]
+
+    def render(values):
+        out = [literals[0]]
+        for field, literal in zip(fields, literals[1:]):
+            out.append(values[field])
+            out.append(literal)
+        return "".join(out)
+
+    return render
+
+class CompiledPlaybook:
+    """Follow-up templates of one playbook, compiled for repeated rendering"""
+
+    def __init__(self, playbook):
+        self.templates = {
+            key: compile_template(template)
+            for key, template in (playbook.follow_up_templates or {}).items()
+        }
+
+    def render(self, outcome, message_type, lead):
+        """Render the best template for an outcome, or return None if there is none"""
+        render = self.templates.get(f"{outcome}_{message_type}") or self.templates.get(f"default_{message_type}")
+        if render is None:
+            return None
+        return render({
+            "lead_name": lead.name,
+            "company": lead.company or "your business",
+            "agent_name": AGENT_NAME
+        })
+
+_compiled = {}
+
+def compile_playbook(playbook):
+    """Compiled templates for a playbook, cached until the playbook changes"""
+    key = (playbook.id, playbook.updated_at)
+    compiled = _compiled.get(key)
+    if compiled is None:
+        compiled = _compiled[key] = CompiledPlaybook(playbook)
+    return compiled
+
+def recipient_for(lead, channel):
+    # Twilio expects E.164; phone_e164 is None only for numbers that could not be normalized
+    return (lead.phone_e164 or lead.phone) if channel == "sms" else lead.email
+
+@job_queue.task("voice.bulk_follow_up", max_attempts=1)
+def run_bulk_follow_ups(since=None, until=None, campaign=None, channels=("email",), dispatch=True, chunk_size=1000,
+                        max_send_attempts=3, pending_stale_after=PENDING_STALE_AFTER):
+    """Generate (and optionally send) follow-ups for completed calls in a window or campaign.
+
+    Calls are walked in id order in chunks of ``chunk_size`` (keyset
+    pagination), so memory stays flat for any number of calls. Calls that
+    already have a sent (or skipped) follow-up on a channel are skipped;
+    follow-ups that failed to send, or were left pending by an interrupted run
+    for longer than ``pending_stale_after``, are sent again, up to
+    ``max_send_attempts`` in total. Nightly runs are therefore safe to repeat
+    and finish what earlier runs left, and a run overlapping another one does
+    not resend what that run is still sending. Returns a summary of counts.
+    """
+    since = datetime.fromisoformat(since) if isinstance(since, str) else since
+    until = datetime.fromisoformat(until) if isinstance(until, str) else until
+
+    playbooks = {playbook.industry: compile_playbook(playbook) for playbook in SalesPlaybook.query.all()}
+    senders = {channel: get_sender(channel) for channel in channels} if dispatch else {}
+
+    query = db.session.query(Call, Lead).join(Lead, Call.lead_id == Lead.id).filter(Call.status == "completed")
+    if since:
+        query = query.filter(Call.completed_at >= since)
+    if until:
+        query = query.filter(Call.completed_at < until)
+    if campaign:
+        query = query.filter(Call.campaign == campaign)
+
+    if isinstance(pending_stale_after, (int, float)):
+        pending_stale_after = timedelta(seconds=pending_stale_after)
+
+    summary = {"calls": 0, "generated": 0, "retried": 0, "in_flight": 0, "sent": 0, "failed": 0, "skipped": 0}
+    last_id = 0
+
+    while True:
+        rows = query.filter(Call.id > last_id).order_by(Call.id).limit(chunk_size).all()
+        if not rows:
+            break
+        last_id = rows[-1][0].id
+        summary["calls"] += len(rows)
+
+        existing = {}
+        for follow_up in FollowUp.query.filter(FollowUp.call_id.in_([call.id for call, _ in rows])).order_by(FollowUp.id):
+            existing.setdefault((follow_up.call_id, follow_up.channel), []).append(follow_up)
+
+        stale_before = datetime.utcnow() - pending_stale_after
+        pending = {channel: [] for channel in channels}
+        for call, lead in rows:
+            compiled = playbooks.get(lead.industry)
+            for channel in channels:
+                previous = existing.get((call.id, channel))
+                if previous:
+                    latest = previous[-1]
+                    finished = any(follow_up.status in FINAL_STATUSES for follow_up in previous)
+                    if not dispatch or finished or (latest.attempts or 0) >= max_send_attempts:
+                        continue
+                    if latest.status == "pending" and latest.attempted_at and latest.attempted_at > stale_before:
+                        summary["in_flight"] += 1
+                        continue
+                    latest.recipient = recipient_for(lead, channel)
+                    pending[channel].append(latest)
+                    summary["retried"] += 1
+                    continue
+                message = compiled.render(call.outcome, channel, lead) if compiled else None
+                if message is None:
+                    summary["skipped"] += 1
+                    continue
+
+                follow_up = FollowUp(
+                    call_id=call.id,
+                    lead_id=lead.id,
+                    channel=channel,
+                    recipient=recipient_for(lead, channel),
+                    message=message
+                )
+                if not follow_up.recipient:
+                    follow_up.status = "skipped"
+                    follow_up.error = f"Lead has no {channel} contact"
+                    summary["skipped"] += 1
+                else:
+                    pending[channel].append(follow_up)
+                db.session.add(follow_up)
+                summary["generated"] += 1
+
+        outgoing = {
+            channel: [{"to": follow_up.recipient, "body": follow_up.message} for follow_up in follow_ups]
+            for channel, follow_ups in pending.items()
+        }
+        if dispatch:
+            attempted_at = datetime.utcnow()
+            for follow_ups in pending.values():
+                for follow_up in follow_ups:
+                    follow_up.status = "pending"
+                    follow_up.attempts = (follow_up.attempts or 0) + 1
+                    follow_up.attempted_at = attempted_at
+        # Persist as pending (with the attempt counted) before sending, so a crash mid-dispatch is retried a bounded number of times
+        db.session.commit()
+
+        for channel, follow_ups in pending.items():
+            if not follow_ups or channel not in senders:
+                continue
+            results = senders[channel].send(outgoing[channel])
+            sent_at = datetime.utcnow()
+            for follow_up, (ok, provider_message_id, error) in zip(follow_ups, results):
+                follow_up.status = "sent" if ok else "failed"
+                follow_up.provider_message_id = provider_message_id
+                follow_up.error = error
+                follow_up.sent_at = sent_at if ok else None
+                summary["sent" if ok else "failed"] += 1
+
+        db.session.commit()
+        # Drop the chunk from the identity map so long runs don't accumulate objects
+        db.session.expunge_all()
+
+    return summary
@@ -0,0 +1,282 @@
+from flask import request, jsonify, url_for
+from src.models.job import Job, db
+from datetime import datetime, timedelta
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+class JobQueue:
+    """Local background job queue backed by the app's SQLite database.
+
+    Jobs are rows in the ``jobs`` table, so no external broker is needed and
+    several web processes can share one queue: a job is claimed with a
+    conditional UPDATE, which only one worker can win. Each process runs its
+    own pool of worker threads, started with its first request (or enqueue).
+
+    Running jobs hold a lease that their process renews every third of
+    ``JOB_LEASE_SECONDS``. If a process dies mid-job the lease runs out and
+    any process puts the job back in the queue (or fails it when it has no
+    attempts left).
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.handlers = {}
+        self.provider_limits = {}
+        self._running = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._workers = []
+        self._active = set()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('JOB_WORKERS', int(os.getenv('JOB_WORKERS', 4)))
+        app.config.setdefault('JOB_POLL_INTERVAL', float(os.getenv('JOB_POLL_INTERVAL', 1.0)))
+        app.config.setdefault('JOB_RETRY_BACKOFF', float(os.getenv('JOB_RETRY_BACKOFF', 2.0)))
+        app.config.setdefault('JOB_LEASE_SECONDS', float(os.getenv('JOB_LEASE_SECONDS', 60)))
+        app.config.setdefault('JOB_PROVIDER_LIMITS', {
+            'openai': int(os.getenv('JOB_CONCURRENCY_OPENAI', 4)),
+            'elevenlabs': int(os.getenv('JOB_CONCURRENCY_ELEVENLABS', 2))
+        })
+        self.app = app
+        self.provider_limits = dict(app.config['JOB_PROVIDER_LIMITS'])
+        app.extensions['job_queue'] = self
+        # Start on the first request rather than here, so CLI commands such as init-db don't run workers
+        app.before_request(self.start)
+
+    def task(self, name, provider=None, max_attempts=3):
+        """Register a function as a job handler.
+
+        The handler is called with the job payload as keyword arguments inside
+        an app context, and must return a JSON-serializable result.
+        """
+        def decorator(func):
+            self.handlers[name] = (func, provider, max_attempts)
+            return func
+        return decorator
+
+    def enqueue(self, name, **payload):
+        """Persist a new job and wake the worker pool. Returns the Job row."""
+        if name not in self.handlers:
+            raise ValueError(f"Unknown job type: {name}")
+
+        _, provider, max_attempts = self.handlers[name]
+        job = Job(
+            type=name,
+            provider=provider,
+            payload=payload,
+            max_attempts=max_attempts,
+            run_after=datetime.utcnow()
+        )
+        db.session.add(job)
+        db.session.commit()
+
+        self.start()
+        self._wakeup.set()
+        return job
+
+    def start(self):
+        """Start the worker threads if they are not running yet"""
+        if self._workers:
+            return
+        with self._lock:
+            if self._workers or self.app is None:
+                return
+            self._stopping.clear()
+            for i in range(self.app.config['JOB_WORKERS']):
+                worker = threading.Thread(target=self._worker_loop, name=f"job-worker-{i}", daemon=True)
+                worker.start()
+                self._workers.append(worker)
+            heartbeat = threading.Thread(target=self._heartbeat_loop, name="job-heartbeat", daemon=True)
+            heartbeat.start()
+            self._workers.append(heartbeat)
+
+    def stop(self, timeout=None):
+        """Signal the worker threads to exit and wait for them"""
+        self._stopping.set()
+        self._wakeup.set()
+        for worker in self._workers:
+            worker.join(timeout)
+        self._workers = []
+
+    def _worker_loop(self):
+        while not self._stopping.is_set():
+            with self.app.app_context():
+                try:
+                    job_id = self._claim_next()
+                    if job_id is not None:
+                        self._run(job_id)
+                        continue
+                except Exception:
+                    # Transient errors such as "database is locked" must not kill the worker;
+                    # a job it had claimed is requeued once its lease runs out
+                    db.session.rollback()
+                    logger.exception("Job worker iteration failed")
+
+            self._wakeup.wait(self.app.config['JOB_POLL_INTERVAL'])
+            self._wakeup.clear()
+
+    def _heartbeat_loop(self):
+        # Reclaim once at start-up, then renew and reclaim every third of the lease
+        interval = self.app.config['JOB_LEASE_SECONDS'] / 3
+        while True:
+            with self.app.app_context():
+                try:
+                    self._renew_leases()
+                    self._reclaim_expired()
+                except Exception:
+                    db.session.rollback()
+                    logger.exception("Job lease heartbeat failed")
+            if self._stopping.wait(interval):
+                return
+
+    def _renew_leases(self):
+        with self._lock:
+            active = list(self._active)
+        if not active:
+            return
+        Job.query.filter(Job.id.in_(active), Job.status == 'running').update(
+            {'heartbeat_at': datetime.utcnow()}, synchronize_session=False
+        )
+        db.session.commit()
+
+    def _reclaim_expired(self):
+        """Requeue (or fail, without attempts left) running jobs whose lease has run out"""
+        now = datetime.utcnow()
+        expired_before = now - timedelta(seconds=self.app.config['JOB_LEASE_SECONDS'])
+        with self._lock:
+            active = list(self._active)
+
+        expired = [
+            Job.status == 'running',
+            db.or_(Job.heartbeat_at < expired_before, db.and_(Job.heartbeat_at.is_(None), Job.started_at < expired_before))
+        ]
+        if active:
+            expired.append(Job.id.notin_(active))
+        error = "Lease expired: the worker running this job stopped before it finished"
+
+        requeued = Job.query.filter(*expired, Job.attempts < Job.max_attempts).update(
+            {'status': 'queued', 'run_after': now, 'error': error}, synchronize_session=False
+        )
+        Job.query.filter(*expired, Job.attempts >= Job.max_attempts).update(
+            {'status': 'failed', 'finished_at': now, 'error': error}, synchronize_session=False
+        )
+        db.session.commit()
+        if requeued:
+            self._wakeup.set()
+
+    def _claim_next(self):
+        """Claim the next runnable job whose provider has a free slot.
+
+        Returns the claimed job id (with the provider slot held) or None.
+        """
+        with self._lock:
+            saturated = [
+                provider for provider, limit in self.provider_limits.items()
+                if self._running.get(provider, 0) >= limit
+            ]
+
+        query = Job.query.filter(Job.status == 'queued', Job.run_after <= datetime.utcnow())
+        if saturated:
+            query = query.filter(db.or_(Job.provider.is_(None), Job.provider.notin_(saturated)))
+        candidate = query.order_by(Job.run_after, Job.id).first()
+        if not candidate:
+            return None
+
+        job_id, provider = candidate.id, candidate.provider
+        if not self._acquire_slot(provider):
+            return None
+
+        now = datetime.utcnow()
+        try:
+            claimed = Job.query.filter_by(id=job_id, status='queued').update({
+                'status': 'running',
+                'attempts': Job.attempts + 1,
+                'started_at': now,
+                'heartbeat_at': now
+            }, synchronize_session=False)
+            db.session.commit()
+        except Exception:
+            self._release_slot(provider)
+            raise
+
+        if not claimed:
+            # Another worker won the race for this job
+            self._release_slot(provider)
+            return None
+        with self._lock:
+            self._active.add(job_id)
+        return job_id
+
+    def _acquire_slot(self, provider):
+        if provider is None:
+            return True
+        with self._lock:
+            limit = self.provider_limits.get(provider)
+            if limit is not None and self._running.get(provider, 0) >= limit:
+                return False
+            self._running[provider] = self._running.get(provider, 0) + 1
+            return True
+
+    def _release_slot(self, provider):
+        if provider is None:
+            return
+        with self._lock:
+            self._running[provider] = max(self._running.get(provider, 0) - 1, 0)
+
+    def _run(self, job_id):
+        job = db.session.get(Job, job_id)
+        job_type, provider, payload = job.type, job.provider, job.payload or {}
+        try:
+            handler = self.handlers.get(job_type)
+            if handler is None:
+                raise ValueError(f"No handler registered for job type: {job_type}")
+
+            result = handler[0](**payload)
+
+            # Re-fetch: the handler may have committed or cleared the session
+            job = db.session.get(Job, job_id)
+            job.status = 'succeeded'
+            job.result = result
+            job.error = None
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+
+        except Exception as e:
+            db.session.rollback()
+            job = db.session.get(Job, job_id)
+            job.error = str(e)
+            if job.attempts < job.max_attempts:
+                # Exponential backoff: 2s, 4s, 8s, ... with the default base
+                delay = self.app.config['JOB_RETRY_BACKOFF'] * (2 ** (job.attempts - 1))
+                job.status = 'queued'
+                job.run_after = datetime.utcnow() + timedelta(seconds=delay)
+            else:
+                job.status = 'failed'
+                job.finished_at = datetime.utcnow()
+            db.session.commit()
+
+        finally:
+            with self._lock:
+                self._active.discard(job_id)
+            self._release_slot(provider)
+
+job_queue = JobQueue()
+
+def wants_async(data):
+    """Whether the caller asked for the work to run as a background job"""
+    return bool(data.get("async")) or request.args.get("async", "").lower() in ("1", "true", "yes")
+
+def job_accepted(job):
+    """202 response pointing the caller at the job status and result endpoints"""
+    return jsonify({
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": url_for("jobs.get_job", job_id=job.id),
+        "result_url": url_for("jobs.get_job_result", job_id=job.id)
+    }), 202
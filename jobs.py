@@ -0,0 +1,28 @@
+from flask import Blueprint, jsonify
+from src.models.job import Job
+
+jobs_bp = Blueprint("jobs", __name__)
+
+@jobs_bp.route("/jobs/<int:job_id>", methods=["GET"])
+def get_job(job_id):
+    """Get the status of a background job"""
+    try:
+        job = Job.query.get_or_404(job_id)
+        return jsonify(job.to_dict())
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@jobs_bp.route("/jobs/<int:job_id>/result", methods=["GET"])
+def get_job_result(job_id):
+    """Get the result of a background job (202 while it is still pending)"""
+    try:
+        job = Job.query.get_or_404(job_id)
+
+        if job.status == "succeeded":
+            return jsonify(job.result)
+        if job.status == "failed":
+            return jsonify({"error": job.error, "job": job.to_dict()}), 500
+
+        return jsonify(job.to_dict()), 202
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
@@ -1,13 +1,16 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 from src.models.user import db
+from src.services.phone import normalize_phone
 
 class Lead(db.Model):
     __tablename__ = 'leads'
+    __table_args__ = {'sqlite_autoincrement': True}  # archived rows are deleted, so ids must never be reused
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     phone = db.Column(db.String(20), nullable=False, unique=True)
+    phone_e164 = db.Column(db.String(20), nullable=True, index=True)  # normalized copy of phone, used for duplicate checks
     email = db.Column(db.String(120), nullable=True)
     company = db.Column(db.String(100), nullable=True)
     industry = db.Column(db.String(50), nullable=False)
@@ -20,11 +23,18 @@ class Lead(db.Model):
     # Relationship with calls
     calls = db.relationship('Call', backref='lead', lazy=True, cascade='all, delete-orphan')
     
+    @db.validates('phone')
+    def validate_phone(self, key, phone):
+        # Keep the normalized copy in sync however the phone is set
+        self.phone_e164 = normalize_phone(phone)
+        return phone
+    
     def to_dict(self):
         return {
             'id': self.id,
             'name': self.name,
             'phone': self.phone,
+            'phone_e164': self.phone_e164,
             'email': self.email,
             'company': self.company,
             'industry': self.industry,
@@ -38,6 +48,7 @@ class Lead(db.Model):
 
 class Call(db.Model):
     __tablename__ = 'calls'
+    __table_args__ = {'sqlite_autoincrement': True}  # archived rows are deleted, so ids must never be reused
     
     id = db.Column(db.Integer, primary_key=True)
     lead_id = db.Column(db.Integer, db.ForeignKey('leads.id'), nullable=False)
@@ -48,9 +59,10 @@ class Call(db.Model):
     transcript = db.Column(db.Text, nullable=True)
     sentiment_score = db.Column(db.Float, default=0.0)
     outcome = db.Column(db.String(50), nullable=True)  # appointment, interested, not_interested, callback
+    campaign = db.Column(db.String(100), nullable=True, index=True)
     notes = db.Column(db.Text, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    completed_at = db.Column(db.DateTime, nullable=True)
+    completed_at = db.Column(db.DateTime, nullable=True, index=True)
     
     def to_dict(self):
         return {
@@ -63,6 +75,7 @@ class Call(db.Model):
             'transcript': self.transcript,
             'sentiment_score': self.sentiment_score,
             'outcome': self.outcome,
+            'campaign': self.campaign,
             'notes': self.notes,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'completed_at': self.completed_at.isoformat() if self.completed_at else None
@@ -96,3 +109,38 @@ class SalesPlaybook(db.Model):
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
 
+class FollowUp(db.Model):
+    __tablename__ = 'follow_ups'
+    __table_args__ = {'sqlite_autoincrement': True}  # archived rows are deleted, so ids must never be reused
+    
+    id = db.Column(db.Integer, primary_key=True)
+    call_id = db.Column(db.Integer, db.ForeignKey('calls.id'), nullable=False, index=True)
+    lead_id = db.Column(db.Integer, db.ForeignKey('leads.id'), nullable=False)
+    channel = db.Column(db.String(10), nullable=False)  # email, sms
+    recipient = db.Column(db.String(120), nullable=True)
+    message = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), default='pending')  # pending, sent, failed, skipped
+    attempts = db.Column(db.Integer, default=0)  # send attempts, bounded so reruns don't retry forever
+    attempted_at = db.Column(db.DateTime, nullable=True)  # start of the latest send attempt
+    provider_message_id = db.Column(db.String(100), nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'call_id': self.call_id,
+            'lead_id': self.lead_id,
+            'channel': self.channel,
+            'recipient': self.recipient,
+            'message': self.message,
+            'status': self.status,
+            'attempts': self.attempts,
+            'attempted_at': self.attempted_at.isoformat() if self.attempted_at else None,
+            'provider_message_id': self.provider_message_id,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'sent_at': self.sent_at.isoformat() if self.sent_at else None
+        }
+
@@ -1,6 +1,13 @@
 from flask import Blueprint, request, jsonify
 from src.models.lead import Lead, Call, SalesPlaybook, db
+from src.models.archive import ArchivePartition
+from src.services.archiver import archive_cold_rows, archived_totals, read_lead_archive
+from src.services.dedup import DUPLICATES_PAGE_SIZE, find_duplicate_page, merge_leads
+from src.services.job_queue import job_queue, job_accepted
+from src.services.phone import normalize_phone
+from collections import Counter
 from datetime import datetime
+import click
 import csv
 import io
 
@@ -43,8 +50,11 @@ def create_lead():
     try:
         data = request.get_json()
         
-        # Check if lead with phone already exists
-        existing_lead = Lead.query.filter_by(phone=data["phone"]).first()
+        # Check if lead with phone already exists, in any formatting
+        phone_e164 = normalize_phone(data["phone"])
+        existing_lead = Lead.query.filter(
+            db.or_(Lead.phone == data["phone"], Lead.phone_e164 == phone_e164) if phone_e164 else Lead.phone == data["phone"]
+        ).first()
         if existing_lead:
             return jsonify({"error": "Lead with this phone number already exists"}), 400
         
@@ -78,23 +88,34 @@ def bulk_import_leads():
         
         # Read CSV content
         stream = io.StringIO(file.stream.read().decode("UTF8"), newline=None)
-        csv_input = csv.DictReader(stream)
+        rows = list(csv.DictReader(stream))
+        
+        # Look up existing phones for the whole file in a few queries instead of one per row
+        raw_phones = {row["phone"] for row in rows if row.get("phone")}
+        normalized_phones = {normalize_phone(phone) for phone in raw_phones} - {None}
+        existing_phones = set()
+        for column, values in ((Lead.phone, list(raw_phones)), (Lead.phone_e164, list(normalized_phones))):
+            for start in range(0, len(values), 500):
+                existing_phones.update(
+                    phone for (phone,) in db.session.query(column).filter(column.in_(values[start:start + 500]))
+                )
         
         imported_count = 0
         errors = []
         
-        for row_num, row in enumerate(csv_input, start=2):
+        for row_num, row in enumerate(rows, start=2):
             try:
                 # Check required fields
                 if not row.get("name") or not row.get("phone") or not row.get("industry"):
                     errors.append(f"Row {row_num}: Missing required fields (name, phone, industry)")
                     continue
                 
-                # Check if lead already exists
-                existing_lead = Lead.query.filter_by(phone=row["phone"]).first()
-                if existing_lead:
-                    errors.append(f"Row {row_num}: Lead with phone {row["phone"]} already exists")
+                # Check if lead already exists (or appeared earlier in this file)
+                phone_key = normalize_phone(row["phone"]) or row["phone"]
+                if phone_key in existing_phones or row["phone"] in existing_phones:
+                    errors.append(f"Row {row_num}: Lead with phone {row['phone']} already exists")
                     continue
+                existing_phones.update((phone_key, row["phone"]))
                 
                 lead = Lead(
                     name=row["name"],
@@ -124,13 +145,68 @@ def bulk_import_leads():
 
 @leads_bp.route("/leads/<int:lead_id>", methods=["GET"])
 def get_lead(lead_id):
-    """Get a specific lead with call history"""
+    """Get a specific lead with call history (?include_archived=1 reads through to the archive)"""
     try:
-        lead = Lead.query.get_or_404(lead_id)
+        include_archived = request.args.get("include_archived", "").lower() in ("1", "true", "yes")
+        lead = db.session.get(Lead, lead_id)
+        
+        if lead is None and include_archived:
+            archived_lead, archived_calls = read_lead_archive(lead_id)
+            if archived_lead is None:
+                return jsonify({"error": "Lead not found"}), 404
+            return jsonify({**archived_lead, "archived": True, "calls": archived_calls})
+        
+        lead = lead or Lead.query.get_or_404(lead_id)
+        lead_data = lead.to_dict()
+        lead_data["calls"] = [call.to_dict() for call in lead.calls]
+        
+        if include_archived:
+            _, archived_calls = read_lead_archive(lead_id)
+            lead_data["calls"] = archived_calls + lead_data["calls"]
+            lead_data["archived_calls_count"] = len(archived_calls)
+        
+        return jsonify(lead_data)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@leads_bp.route("/leads/duplicates", methods=["GET"])
+def get_duplicate_leads():
+    """Find clusters of likely duplicate leads (runs as a background job)"""
+    try:
+        options = {
+            "threshold": request.args.get("threshold", 0.85, type=float),
+            "max_block_size": request.args.get("max_block_size", 50, type=int),
+            "limit": max(request.args.get("limit", DUPLICATES_PAGE_SIZE, type=int), 1),
+            "offset": max(request.args.get("offset", 0, type=int), 0)
+        }
+        
+        # A full pass over every lead, so this is a background job unless asked otherwise
+        if request.args.get("async", "true").lower() not in ("0", "false", "no"):
+            return job_accepted(job_queue.enqueue("leads.find_duplicates", **options))
+        
+        return jsonify(find_duplicate_page(**options))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@leads_bp.route("/leads/<int:lead_id>/merge", methods=["POST"])
+def merge_lead(lead_id):
+    """Merge duplicate leads (and their calls) into this lead"""
+    try:
+        data = request.get_json()
+        duplicate_ids = data.get("duplicate_ids")
+        
+        if not duplicate_ids:
+            return jsonify({"error": "duplicate_ids is required"}), 400
+        
+        lead = merge_leads(lead_id, duplicate_ids)
         lead_data = lead.to_dict()
         lead_data["calls"] = [call.to_dict() for call in lead.calls]
         return jsonify(lead_data)
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
+        db.session.rollback()
         return jsonify({"error": str(e)}), 500
 
 @leads_bp.route("/leads/<int:lead_id>", methods=["PUT"])
@@ -172,6 +248,7 @@ def create_call(lead_id):
             transcript=data.get("transcript"),
             sentiment_score=data.get("sentiment_score", 0.0),
             outcome=data.get("outcome"),
+            campaign=data.get("campaign"),
             notes=data.get("notes")
         )
         
@@ -226,8 +303,10 @@ def create_playbook():
 
 @leads_bp.route("/analytics/dashboard", methods=["GET"])
 def get_dashboard_analytics():
-    """Get dashboard analytics data"""
+    """Get dashboard analytics data (?include_archived=1 adds archived history)"""
     try:
+        include_archived = request.args.get("include_archived", "").lower() in ("1", "true", "yes")
+        
         # Total leads
         total_leads = Lead.query.count()
         
@@ -253,6 +332,21 @@ def get_dashboard_analytics():
         
         # Conversion rate
         converted_leads = Lead.query.filter_by(status="converted").count()
+        
+        if include_archived:
+            # Archived rows are only counted through per-partition aggregates, never re-read
+            archived = archived_totals()
+            duration_count = db.session.query(db.func.count(Call.id)).filter(Call.duration > 0).scalar()
+            duration_sum = avg_duration * duration_count + archived["duration_sum"]
+            duration_count += archived["duration_count"]
+            avg_duration = duration_sum / duration_count if duration_count else 0
+            
+            total_leads += archived["leads"]
+            total_calls += archived["calls"]
+            converted_leads += archived["leads_by_status"]["converted"]
+            leads_by_status = (Counter(dict(leads_by_status)) + archived["leads_by_status"]).items()
+            calls_by_outcome = (Counter(dict(calls_by_outcome)) + archived["calls_by_outcome"]).items()
+        
         conversion_rate = (converted_leads / total_leads * 100) if total_leads > 0 else 0
         
         # Recent calls
@@ -278,4 +372,36 @@ def get_dashboard_analytics():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@leads_bp.route("/archive/run", methods=["POST"])
+def run_archive():
+    """Move cold leads and calls to archive storage (runs as a background job)"""
+    try:
+        data = request.get_json(silent=True) or {}
+        options = {
+            "older_than_days": data.get("older_than_days", 90),
+            "batch_size": data.get("batch_size", 500)
+        }
+        
+        if data.get("async", True):
+            return job_accepted(job_queue.enqueue("archive.cold_rows", **options))
+        
+        return jsonify(archive_cold_rows(**options))
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
+@leads_bp.route("/archive/partitions", methods=["GET"])
+def get_archive_partitions():
+    """List archive partitions with their row counts"""
+    try:
+        partitions = ArchivePartition.query.order_by(ArchivePartition.table_name, ArchivePartition.partition).all()
+        return jsonify([partition.to_dict() for partition in partitions])
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
+@leads_bp.cli.command("archive")
+@click.option("--older-than-days", default=90, show_default=True, help="Archive closed leads and completed calls older than this")
+@click.option("--batch-size", default=500, show_default=True)
+def archive_command(older_than_days, batch_size):
+    """Move cold leads and calls to archive storage (e.g. from a nightly cron)"""
+    click.echo(archive_cold_rows(older_than_days=older_than_days, batch_size=batch_size))
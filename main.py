@@ -3,12 +3,16 @@ import sys
 # DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
+import click
 from flask import Flask, send_from_directory
 from flask_cors import CORS
 from src.models.user import db
+from src.models.schema import upgrade_schema
 from src.routes.user import user_bp
 from src.routes.leads import leads_bp
 from src.routes.voice_agent import voice_agent_bp
+from src.routes.jobs import jobs_bp
+from src.services.job_queue import job_queue
 
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
 app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
@@ -19,13 +23,24 @@ CORS(app)
 app.register_blueprint(user_bp, url_prefix='/api')
 app.register_blueprint(leads_bp, url_prefix='/api')
 app.register_blueprint(voice_agent_bp, url_prefix='/api')
+app.register_blueprint(jobs_bp, url_prefix='/api')
 
 # uncomment if you need to use database
 app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# A blank ARCHIVE_DIR (as in .env.example) means the default, not the working directory
+app.config['ARCHIVE_DIR'] = os.getenv('ARCHIVE_DIR') or os.path.join(os.path.dirname(__file__), 'database', 'archive')
 db.init_app(app)
-with app.app_context():
-    db.create_all()
+job_queue.init_app(app)
+
+# Schema setup is an explicit step (`flask --app src.main init-db`) rather than
+# something every worker does at import time
+@app.cli.command("init-db")
+def init_db_command():
+    """Create database tables that don't exist yet and add columns that older databases lack"""
+    os.makedirs(os.path.join(os.path.dirname(__file__), 'database'), exist_ok=True)
+    added = upgrade_schema()
+    click.echo(f"Database initialized (upgraded: {', '.join(added)})" if added else "Database initialized")
 
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
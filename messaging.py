@@ -0,0 +1,153 @@
+from email.message import EmailMessage
+import itertools
+import logging
+import os
+import smtplib
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+class StubTransport:
+    """Local transport that records messages instead of sending them.
+
+    Used by default and in testing; every message "succeeds" and is kept in
+    ``outbox`` so callers can inspect what would have been delivered.
+    """
+    rate_limit = None
+
+    def __init__(self, channel):
+        self.channel = channel
+        self.outbox = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def send_many(self, messages):
+        results = []
+        with self._lock:
+            for message in messages:
+                message_id = f"stub-{self.channel}-{next(self._ids)}"
+                self.outbox.append({**message, "provider_message_id": message_id})
+                logger.info("Stub %s to %s: %s", self.channel, message["to"], message["body"][:80])
+                results.append((True, message_id, None))
+        return results
+
+class TwilioSmsTransport:
+    """Send SMS through Twilio's messaging API"""
+    rate_limit = 10.0  # messages per second
+
+    def __init__(self):
+        from twilio.rest import Client
+
+        account_sid = os.getenv('TWILIO_ACCOUNT_SID')
+        auth_token = os.getenv('TWILIO_AUTH_TOKEN')
+        if not account_sid or not auth_token:
+            raise ValueError("Twilio credentials not set in environment variables")
+        self.client = Client(account_sid, auth_token)
+        self.from_number = os.getenv('TWILIO_PHONE_NUMBER')
+
+    def send_many(self, messages):
+        # Twilio has no batch endpoint; reuse one client (and its HTTP session) for the batch
+        results = []
+        for message in messages:
+            try:
+                sent = self.client.messages.create(to=message["to"], from_=self.from_number, body=message["body"])
+                results.append((True, sent.sid, None))
+            except Exception as e:
+                results.append((False, None, str(e)))
+        return results
+
+class SmtpEmailTransport:
+    """Send email over SMTP, one connection per batch"""
+    rate_limit = 20.0  # messages per second
+
+    def __init__(self):
+        self.host = os.getenv('SMTP_HOST')
+        if not self.host:
+            raise ValueError("SMTP_HOST environment variable not set")
+        self.port = int(os.getenv('SMTP_PORT') or 587)
+        self.username = os.getenv('SMTP_USERNAME')
+        self.password = os.getenv('SMTP_PASSWORD')
+        # Blank values from .env count as unset
+        self.from_address = os.getenv('FOLLOW_UP_FROM_EMAIL') or self.username
+
+    def send_many(self, messages):
+        results = []
+        with smtplib.SMTP(self.host, self.port) as smtp:
+            smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password)
+            for message in messages:
+                email = EmailMessage()
+                email["From"] = self.from_address
+                email["To"] = message["to"]
+                email["Subject"] = message.get("subject", "Following up")
+                email.set_content(message["body"])
+                try:
+                    smtp.send_message(email)
+                    results.append((True, None, None))
+                except Exception as e:
+                    results.append((False, None, str(e)))
+        return results
+
+class RateLimitedSender:
+    """Send messages through a transport in fixed-size batches under a rate limit.
+
+    ``rate`` is in messages per second (None disables limiting). The limit is
+    enforced with a token bucket so a batch only waits for the tokens it
+    actually needs.
+    """
+
+    def __init__(self, transport, rate=None, batch_size=100):
+        self.transport = transport
+        self.rate = rate
+        self.batch_size = batch_size
+        self._tokens = float(batch_size)
+        self._last = time.monotonic()
+
+    def _wait_for(self, count):
+        if not self.rate:
+            return
+        self._tokens = min(self._tokens + (time.monotonic() - self._last) * self.rate, float(self.batch_size))
+        self._last = time.monotonic()
+        if self._tokens < count:
+            time.sleep((count - self._tokens) / self.rate)
+            self._tokens = float(count)
+            self._last = time.monotonic()
+        self._tokens -= count
+
+    def send(self, messages):
+        """Send all messages; returns (ok, provider_message_id, error) per message, in order"""
+        results = []
+        for start in range(0, len(messages), self.batch_size):
+            batch = messages[start:start + self.batch_size]
+            self._wait_for(len(batch))
+            try:
+                results.extend(self.transport.send_many(batch))
+            except Exception as e:
+                # Transport-level failure (e.g. SMTP connection refused) fails the whole batch
+                results.extend((False, None, str(e)) for _ in batch)
+        return results
+
+_stub_transports = {}
+
+def get_sender(channel):
+    """Build the sender for a channel ("sms" or "email") from environment settings.
+
+    FOLLOW_UP_TRANSPORT=stub (the default) keeps everything local.
+    """
+    if os.getenv('FOLLOW_UP_TRANSPORT', 'stub') == 'stub':
+        transport = _stub_transports.setdefault(channel, StubTransport(channel))
+    elif channel == 'sms':
+        transport = TwilioSmsTransport()
+    elif channel == 'email':
+        transport = SmtpEmailTransport()
+    else:
+        raise ValueError(f"Unsupported follow-up channel: {channel}")
+
+    rate = os.getenv(f'FOLLOW_UP_{channel.upper()}_RATE')
+    return RateLimitedSender(
+        transport,
+        rate=float(rate) if rate else transport.rate_limit,
+        batch_size=int(os.getenv('FOLLOW_UP_BATCH_SIZE') or 100)
+    )
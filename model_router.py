@@ -0,0 +1,351 @@
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import os
+import random
+import threading
+import time
+
+RouteResult = namedtuple("RouteResult", ["text", "model", "latency_ms", "hedged"])
+
+class CircuitOpenError(RuntimeError):
+    """Raised when every model's circuit breaker is open"""
+
+class BudgetExceededError(TimeoutError):
+    """Raised when no model answered within the latency budget"""
+
+def is_timeout(error):
+    # Covers built-in timeouts and SDK ones such as openai.APITimeoutError
+    return isinstance(error, TimeoutError) or "timeout" in type(error).__name__.lower()
+
+class LatencyTracker:
+    """Rolling window of recent latencies for one model.
+
+    Samples older than ``max_age`` seconds are ignored, so a model demoted
+    after a slowdown (and therefore no longer measured) becomes unmeasured
+    again and gets retried.
+    """
+
+    def __init__(self, window=50, max_age=60.0):
+        self.samples = deque(maxlen=window)
+        self.max_age = max_age
+        self._lock = threading.Lock()
+
+    def record(self, latency_ms):
+        with self._lock:
+            self.samples.append((time.monotonic(), latency_ms))
+
+    def recent(self):
+        cutoff = time.monotonic() - self.max_age if self.max_age is not None else None
+        with self._lock:
+            return [latency for recorded_at, latency in self.samples if cutoff is None or recorded_at >= cutoff]
+
+    def percentile(self, p):
+        """The p-th quantile (0-1) of the recent samples, or None without any"""
+        ordered = sorted(self.recent())
+        if not ordered:
+            return None
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+class CircuitBreaker:
+    """Stop sending traffic to a model after repeated failures.
+
+    After ``failure_threshold`` consecutive failures the breaker opens. Once
+    ``reset_timeout`` seconds have passed, a single trial request is let
+    through (half-open): success closes the breaker, failure re-opens it.
+    """
+
+    def __init__(self, failure_threshold=3, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def available(self):
+        """Whether a request could be allowed right now (does not claim the half-open trial)"""
+        state = self.state
+        return state == "closed" or (state == "half_open" and not self._trial_in_flight)
+
+    def allow(self):
+        """Claim permission to send one request.
+
+        Returns False if the request may not be sent, "trial" if it is the
+        half-open trial request, and True otherwise.
+        """
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return "trial"
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_in_flight or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+    def record_timeout(self, trial=False):
+        # Other requests can time out because their budget was tight, but a trial that doesn't answer re-opens the breaker
+        if trial:
+            self.record_failure()
+
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv("MODEL_ROUTER_WORKERS", 16)), thread_name_prefix="model-router")
+
+class ModelRouter:
+    """Route completions across models under a per-request latency budget.
+
+    ``models`` is in order of preference (best first, e.g. gpt-4 then
+    gpt-3.5-turbo) and ``complete(model, messages, timeout=..., **kwargs)``
+    performs one completion and returns its text. For each request the router
+    picks the most preferred model whose recent latency (``budget_percentile``
+    of the rolling window) fits the remaining budget. Samples expire after
+    ``sample_max_age`` seconds, so a model demoted by a slowdown is tried again. It starts a faster model
+    alongside it when the budget is at risk or a call fails, and, if
+    ``hedge_after_ms`` is set, hedges with a second request once that much
+    time has passed; a backup is only started when it is expected to be
+    faster than what is in flight. Errors (and timeouts of half-open trial
+    requests) feed a circuit breaker per model.
+    """
+
+    def __init__(self, models, complete, hedge_after_ms=None, request_timeout=30.0, window=50, sample_max_age=60.0,
+                 budget_percentile=0.9, risk_factor=1.5, failure_threshold=3, reset_timeout=30.0):
+        self.models = list(models)
+        self.complete = complete
+        self.hedge_after_ms = hedge_after_ms
+        self.risk_factor = risk_factor
+        self.request_timeout = request_timeout
+        self.budget_percentile = budget_percentile
+        self.latency = {model: LatencyTracker(window, sample_max_age) for model in self.models}
+        self.breakers = {model: CircuitBreaker(failure_threshold, reset_timeout) for model in self.models}
+
+    def estimate(self, model):
+        return self.latency[model].percentile(self.budget_percentile)
+
+    def select(self, budget_ms=None, exclude=()):
+        """Pick the model to try next for the given remaining budget"""
+        candidates = [
+            model for model in self.models
+            if model not in exclude and self.breakers[model].available()
+        ]
+        if not candidates:
+            raise CircuitOpenError("No model available: circuit breakers are open")
+        if budget_ms is None:
+            return candidates[0]
+
+        for model in candidates:
+            estimate = self.estimate(model)
+            # Models without history get a chance so their latency gets measured
+            if estimate is None or estimate <= budget_ms:
+                return model
+        return min(candidates, key=self.estimate)
+
+    def record_success(self, model, latency_ms):
+        self.latency[model].record(latency_ms)
+        self.breakers[model].record_success()
+
+    def record_failure(self, model):
+        self.breakers[model].record_failure()
+
+    def record_error(self, model, error, elapsed_ms, trial=False):
+        """Record a failed request: errors trip the breaker, timeouts only update the latency estimate"""
+        if not is_timeout(error):
+            self.record_failure(model)
+            return
+        # The real latency is above elapsed_ms (which is capped by the budget), so record twice that and never
+        # less than the current estimate: the same budget won't pick the model again, a much larger one still can
+        estimate = self.estimate(model)
+        self.latency[model].record(max(2 * elapsed_ms, estimate or 0))
+        self.breakers[model].record_timeout(trial)
+
+    def claim(self, budget_ms=None, exclude=()):
+        """Select a model and claim its breaker for one request; returns (model, trial)"""
+        exclude = list(exclude)
+        while True:
+            model = self.select(budget_ms, exclude=exclude)
+            allowed = self.breakers[model].allow()
+            if allowed:
+                return model, allowed == "trial"
+            # Lost the half-open trial to a concurrent request
+            exclude.append(model)
+
+    def _dispatch(self, model, messages, timeout, trial, kwargs):
+        def run():
+            started = time.monotonic()
+            try:
+                text = self.complete(model, messages, timeout=timeout, **kwargs)
+            except Exception as e:
+                self.record_error(model, e, (time.monotonic() - started) * 1000, trial)
+                raise
+            self.record_success(model, (time.monotonic() - started) * 1000)
+            return text
+
+        return _executor.submit(run)
+
+    def route(self, messages, budget_ms=None, **kwargs):
+        """Run one completion within ``budget_ms`` (None for no budget) and return a RouteResult.
+
+        While a request is in flight, a backup model is launched alongside it
+        when either ``hedge_after_ms`` has passed (first hedge only) or the
+        remaining budget has shrunk to ``risk_factor`` times the backup's
+        expected latency (half the budget if it has no history yet). A backup
+        must be expected to be faster than every model in flight and to fit
+        the remaining budget. If everything in flight fails, the next model is
+        tried regardless. The first successful answer wins.
+        """
+        started = time.monotonic()
+        deadline = started + budget_ms / 1000 if budget_ms is not None else None
+        tried = []
+        pending = {}
+        hedged = False
+        exhausted = False
+        last_error = None
+
+        def remaining():
+            if deadline is None:
+                return None
+            return max(deadline - time.monotonic(), 0.0)
+
+        def dispatch(model, trial):
+            left = remaining()
+            timeout = self.request_timeout if left is None else min(left, self.request_timeout)
+            pending[self._dispatch(model, messages, timeout, trial, kwargs)] = model
+
+        def launch():
+            left = remaining()
+            model, trial = self.claim(left * 1000 if left is not None else None, exclude=tried)
+            tried.append(model)
+            dispatch(model, trial)
+
+        def backup():
+            """The model worth starting alongside those in flight, or None"""
+            in_flight = [self.estimate(model) for model in pending.values()]
+            fastest = min((estimate for estimate in in_flight if estimate is not None), default=None)
+            left = remaining()
+            for model in self.models:
+                if model in tried or not self.breakers[model].available():
+                    continue
+                estimate = self.estimate(model)
+                if estimate is None:
+                    # Unmeasured models only back up models that are unmeasured too
+                    if fastest is None:
+                        return model
+                    continue
+                if (fastest is None or estimate < fastest) and (left is None or estimate <= left * 1000):
+                    return model
+            return None
+
+        def launch_at(model):
+            times = []
+            if self.hedge_after_ms is not None and len(tried) == 1:
+                times.append(started + self.hedge_after_ms / 1000)
+            if deadline is not None:
+                estimate = self.estimate(model)
+                reserve = estimate * self.risk_factor / 1000 if estimate is not None else budget_ms / 2000
+                times.append(deadline - reserve)
+            return min(times) if times else None
+
+        launch()
+
+        while pending:
+            candidate = None if exhausted else backup()
+            wake_at = launch_at(candidate) if candidate is not None else None
+            if deadline is not None:
+                wake_at = deadline if wake_at is None else min(wake_at, deadline)
+            wait_for = None if wake_at is None else max(wake_at - time.monotonic(), 0.0)
+
+            done, _ = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                model = pending.pop(future)
+                try:
+                    text = future.result()
+                except Exception as e:
+                    last_error = e
+                    continue
+                return RouteResult(text, model, round((time.monotonic() - started) * 1000), hedged)
+
+            if deadline is not None and remaining() <= 0:
+                raise BudgetExceededError(f"No model answered within {budget_ms}ms")
+            if exhausted:
+                continue
+
+            if not pending:
+                # Everything in flight failed: fall back to the next model, fast or not
+                try:
+                    launch()
+                except CircuitOpenError:
+                    exhausted = True
+            elif not done and candidate is not None and time.monotonic() >= launch_at(candidate):
+                # The in-flight models are at risk (or due a hedge): start the faster backup
+                tried.append(candidate)
+                trial = self.breakers[candidate].allow()
+                if trial:
+                    dispatch(candidate, trial == "trial")
+                    hedged = True
+
+        raise last_error or CircuitOpenError("No model available: circuit breakers are open")
+
+    def stats(self):
+        return {
+            model: {
+                "p50_ms": self.latency[model].percentile(0.5),
+                "p90_ms": self.latency[model].percentile(0.9),
+                "samples": len(self.latency[model].recent()),
+                "circuit": self.breakers[model].state
+            }
+            for model in self.models
+        }
+
+class StubCompletion:
+    """Local stand-in for a completion provider with injected latency and errors.
+
+    Used when MODEL_PROVIDER=stub, for local development and for exercising
+    the router's budget, hedging and circuit-breaker behaviour without calling
+    OpenAI. Latencies and error rates are per model.
+    """
+
+    def __init__(self, latency_ms=None, error_rate=None, default_latency_ms=200, reply=None):
+        self.latency_ms = latency_ms or {}
+        self.error_rate = error_rate or {}
+        self.default_latency_ms = default_latency_ms
+        self.reply = reply
+
+    @classmethod
+    def from_env(cls):
+        def parse(value):
+            pairs = (item.split("=", 1) for item in value.split(",") if "=" in item)
+            return {model.strip(): float(number) for model, number in pairs}
+
+        return cls(
+            latency_ms=parse(os.getenv("STUB_MODEL_LATENCY_MS", "")),
+            error_rate=parse(os.getenv("STUB_MODEL_ERROR_RATE", ""))
+        )
+
+    def __call__(self, model, messages, timeout=None, **kwargs):
+        latency = self.latency_ms.get(model, self.default_latency_ms) / 1000
+        if timeout is not None and latency > timeout:
+            time.sleep(timeout)
+            raise TimeoutError(f"Stub {model} timed out after {timeout:.2f}s")
+        time.sleep(latency)
+        if random.random() < self.error_rate.get(model, 0.0):
+            raise RuntimeError(f"Stub {model} failed")
+        return self.reply or f"Stub reply from {model}. Sounds positive."
@@ -0,0 +1,35 @@
+import os
+import re
+
+NON_DIGITS_RE = re.compile(r"\D")
+
+def normalize_phone(phone, default_country_code=None):
+    """Normalize a phone number to E.164 (e.g. "+15550102000"), or None if it can't be.
+
+    Numbers without a country code are assumed to be in DEFAULT_PHONE_COUNTRY_CODE
+    (1, i.e. NANP, by default), so "+1 (555) 010-2000", "555.010.2000" and
+    "15550102000" all normalize to the same value. "00" international prefixes
+    are treated like "+".
+    """
+    if not phone:
+        return None
+
+    phone = phone.strip()
+    has_plus = phone.startswith("+")
+    digits = NON_DIGITS_RE.sub("", phone)
+
+    if not has_plus and digits.startswith("00"):
+        digits, has_plus = digits[2:], True
+
+    if not has_plus:
+        country_code = default_country_code or os.getenv("DEFAULT_PHONE_COUNTRY_CODE", "1")
+        if country_code == "1" and len(digits) == 11 and digits.startswith("1"):
+            digits = digits[1:]
+        if country_code == "1" and len(digits) != 10:
+            return None
+        digits = country_code + digits.lstrip("0")
+
+    # E.164 allows at most 15 digits; anything under 8 is not a dialable number
+    if not 8 <= len(digits) <= 15:
+        return None
+    return "+" + digits
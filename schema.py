@@ -0,0 +1,110 @@
+from sqlalchemy.schema import CreateTable
+from src.models.user import db
+from src.models.lead import Lead, Call, FollowUp
+from src.services.archiver import max_archived_id
+from src.services.phone import normalize_phone
+
+# db.create_all() only creates missing tables, so columns and indexes added to
+# existing tables are listed here and added to older databases by upgrade_schema()
+ADDED_COLUMNS = [
+    ("leads", "phone_e164", "VARCHAR(20)"),
+    ("calls", "campaign", "VARCHAR(100)"),
+    ("jobs", "heartbeat_at", "DATETIME"),
+    ("follow_ups", "attempts", "INTEGER DEFAULT 0"),
+    ("follow_ups", "attempted_at", "DATETIME"),
+]
+
+ADDED_INDEXES = [
+    ("ix_leads_phone_e164", "leads", "phone_e164"),
+    ("ix_calls_campaign", "calls", "campaign"),
+    ("ix_calls_completed_at", "calls", "completed_at"),
+]
+
+# Archived rows are deleted from these tables, and SQLite reuses the highest
+# deleted id unless a table is declared AUTOINCREMENT
+AUTOINCREMENT_MODELS = [Lead, Call, FollowUp]
+
+def upgrade_schema():
+    """Create missing tables and bring existing ones up to date.
+
+    Safe to run on every start: added columns are backfilled where the
+    application relies on them. Returns the columns (and table rebuilds)
+    that were added.
+    """
+    db.create_all()
+
+    inspector = db.inspect(db.engine)
+    existing = {}
+    added = []
+    with db.engine.begin() as connection:
+        for table, column, column_type in ADDED_COLUMNS:
+            if table not in existing:
+                existing[table] = {info["name"] for info in inspector.get_columns(table)}
+            if column not in existing[table]:
+                connection.execute(db.text(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}"))
+                added.append(f"{table}.{column}")
+        if connection.dialect.name == "sqlite":
+            for model in AUTOINCREMENT_MODELS:
+                if not has_autoincrement(connection, model.__tablename__):
+                    rebuild_with_autoincrement(connection, model.__table__)
+                    added.append(f"{model.__tablename__} AUTOINCREMENT")
+        for name, table, column in ADDED_INDEXES:
+            connection.execute(db.text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({column})"))
+
+    backfill_phone_e164()
+    return added
+
+def has_autoincrement(connection, table_name):
+    sql = connection.execute(
+        db.text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": table_name}
+    ).scalar()
+    return "AUTOINCREMENT" in (sql or "").upper()
+
+def rebuild_with_autoincrement(connection, table):
+    """Recreate a SQLite table as declared by its model (create, copy, drop, rename).
+
+    Foreign keys are not enforced on these connections, so references from
+    other tables survive the drop. The id sequence starts above every id ever
+    used, including archived rows, so no id comes back.
+    """
+    name = table.name
+    rebuilt = f"{name}_rebuild"
+    ddl = str(CreateTable(table).compile(dialect=connection.dialect)).strip()
+    connection.execute(db.text(ddl.replace(f"CREATE TABLE {name} ", f"CREATE TABLE {rebuilt} ", 1)))
+
+    columns = ", ".join(column.name for column in table.columns)
+    connection.execute(db.text(f"INSERT INTO {rebuilt} ({columns}) SELECT {columns} FROM {name}"))
+    connection.execute(db.text(f"DROP TABLE {name}"))
+    connection.execute(db.text(f"ALTER TABLE {rebuilt} RENAME TO {name}"))
+    for index in table.indexes:
+        index.create(connection, checkfirst=True)
+
+    max_id = connection.execute(db.text(f"SELECT COALESCE(MAX(id), 0) FROM {name}")).scalar()
+    connection.execute(db.text("DELETE FROM sqlite_sequence WHERE name = :name"), {"name": name})
+    connection.execute(
+        db.text("INSERT INTO sqlite_sequence (name, seq) VALUES (:name, :seq)"),
+        {"name": name, "seq": max(max_id, max_archived_id(name))}
+    )
+
+def backfill_phone_e164(batch_size=1000):
+    """Normalize phones of leads that have no phone_e164 yet; returns how many were set"""
+    # updated_at is kept as is: archiving goes by when a lead was last really touched
+    statement = Lead.__table__.update().where(Lead.id == db.bindparam("lead_id")).values(
+        phone_e164=db.bindparam("e164"), updated_at=Lead.updated_at
+    )
+    updated = 0
+    last_id = 0
+    while True:
+        rows = db.session.query(Lead.id, Lead.phone).filter(
+            Lead.id > last_id, Lead.phone_e164.is_(None)
+        ).order_by(Lead.id).limit(batch_size).all()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        params = [{"lead_id": lead_id, "e164": normalize_phone(phone)} for lead_id, phone in rows]
+        params = [param for param in params if param["e164"]]
+        if params:
+            db.session.execute(statement, params)
+            updated += len(params)
+        db.session.commit()
+    return updated
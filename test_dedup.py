@@ -0,0 +1,77 @@
+import unittest
+
+from flask import Flask
+from src.models.user import db
+from src.models.lead import Lead
+from src.services.dedup import LeadRecord, find_duplicate_page, find_duplicates, similarity
+
+def record(id, name, phone, email=None, company=None):
+    return LeadRecord(id, name, phone, email, company)
+
+class SimilarityTest(unittest.TestCase):
+    def test_same_person_with_another_phone_passes_default_threshold(self):
+        a = record(1, "Ann Smith", "+15550102000", "ann@acme.com", "Acme Inc")
+        b = record(2, "Anne Smith", "+15550109999", "anne@acme.com", "Acme")
+
+        self.assertGreaterEqual(similarity(a, b), 0.85)
+
+    def test_different_people_at_same_company_stay_below_threshold(self):
+        a = record(1, "Ann Smith", "+15550102000", "ann@acme.com", "Acme Inc")
+        b = record(2, "Robert Jones", "+15550109999", "rob@acme.com", "Acme")
+
+        self.assertLess(similarity(a, b), 0.85)
+
+    def test_shared_phone_is_a_match(self):
+        a = record(1, "Ann Smith", "+15550102000")
+        b = record(2, "A. Smith", "+15550102000")
+
+        self.assertEqual(similarity(a, b), 1.0)
+
+class FindDuplicatesTest(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+        db.init_app(self.app)
+        self.context = self.app.app_context()
+        self.context.push()
+        db.create_all()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.context.pop()
+
+    def add_lead(self, name, phone, email=None, company=None):
+        lead = Lead(name=name, phone=phone, email=email, company=company, industry="saas")
+        db.session.add(lead)
+        db.session.commit()
+        return lead.id
+
+    def test_reports_near_duplicate_with_different_phone(self):
+        ann = self.add_lead("Ann Smith", "(555) 010-2000", "ann@acme.com", "Acme Inc")
+        anne = self.add_lead("Anne Smith", "555-010-9999", "anne@acme.com", "Acme")
+        self.add_lead("Robert Jones", "555-010-3000", "rob@acme.com", "Acme")
+
+        groups = find_duplicates()
+
+        self.assertEqual([group["lead_ids"] for group in groups], [[ann, anne]])
+
+    def test_reports_same_phone_in_different_formats(self):
+        first = self.add_lead("Bob Brown", "+1 (555) 010-4000")
+        second = self.add_lead("Robert Brown", "5550104000")
+
+        groups = find_duplicates()
+
+        self.assertEqual(groups, [{"lead_ids": [first, second], "score": 1.0}])
+
+    def test_pages_through_clusters_with_total(self):
+        pairs = [(self.add_lead(f"Lead {i}", f"555-010-{i:04d}"), self.add_lead(f"Lead {i}", f"555010{i:04d}"))
+                 for i in range(3)]
+
+        page = find_duplicate_page(limit=2, offset=1)
+
+        self.assertEqual(page["total"], 3)
+        self.assertEqual([group["lead_ids"] for group in page["duplicates"]], [list(pair) for pair in pairs[1:]])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import os
+import tempfile
+import time
+import unittest
+
+from flask import Flask
+from src.models.user import db
+from src.models.job import Job
+from src.services.job_queue import JobQueue
+
+class JobQueueTest(unittest.TestCase):
+    def setUp(self):
+        handle, self.db_path = tempfile.mkstemp(suffix=".db")
+        os.close(handle)
+        self.app = Flask(__name__)
+        self.app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{self.db_path}"
+        self.app.config["JOB_WORKERS"] = 1
+        self.app.config["JOB_POLL_INTERVAL"] = 0.05
+        db.init_app(self.app)
+        self.queue = JobQueue(self.app)
+
+        @self.queue.task("test.echo")
+        def echo(value):
+            return {"value": value}
+
+        with self.app.app_context():
+            db.create_all()
+
+    def tearDown(self):
+        self.queue.stop(timeout=2)
+        with self.app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+        os.remove(self.db_path)
+
+    def wait_for(self, job_id, timeout=3.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self.app.app_context():
+                job = db.session.get(Job, job_id)
+                if job.status in ("succeeded", "failed"):
+                    return job.to_dict(), job.result
+            time.sleep(0.05)
+        self.fail(f"Job {job_id} did not finish")
+
+    def test_runs_enqueued_job(self):
+        with self.app.app_context():
+            job_id = self.queue.enqueue("test.echo", value=1).id
+
+        job, result = self.wait_for(job_id)
+
+        self.assertEqual(job["status"], "succeeded")
+        self.assertEqual(result, {"value": 1})
+
+    def test_worker_survives_transient_error(self):
+        claim_next = self.queue._claim_next
+        failures = []
+
+        def flaky_claim_next():
+            if not failures:
+                failures.append(True)
+                raise RuntimeError("database is locked")
+            return claim_next()
+
+        self.queue._claim_next = flaky_claim_next
+        with self.app.app_context():
+            job_id = self.queue.enqueue("test.echo", value=2).id
+
+        job, result = self.wait_for(job_id)
+
+        self.assertEqual(failures, [True])
+        self.assertEqual(job["status"], "succeeded")
+        self.assertTrue(all(worker.is_alive() for worker in self.queue._workers))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,199 @@
+import time
+import unittest
+
+from src.services.model_router import CircuitOpenError, ModelRouter, StubCompletion
+
+MESSAGES = [{"role": "user", "content": "Hello"}]
+
+class RecordingStub(StubCompletion):
+    """StubCompletion that also records which models were called"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.calls = []
+
+    def __call__(self, model, messages, timeout=None, **kwargs):
+        self.calls.append(model)
+        return super().__call__(model, messages, timeout=timeout, **kwargs)
+
+def make_router(latency_ms, error_rate=None, **kwargs):
+    stub = RecordingStub(latency_ms=latency_ms, error_rate=error_rate)
+    return ModelRouter(list(latency_ms), stub, **kwargs), stub
+
+def seed(router, model, latency_ms, samples=10):
+    for _ in range(samples):
+        router.latency[model].record(latency_ms)
+
+def settle():
+    # Let requests that lost the race finish and record their outcome
+    time.sleep(0.3)
+
+class BudgetTest(unittest.TestCase):
+    def test_picks_faster_model_when_preferred_one_does_not_fit(self):
+        router, stub = make_router({"gpt-4": 300, "gpt-3.5": 20})
+        seed(router, "gpt-4", 300)
+        seed(router, "gpt-3.5", 20)
+
+        result = router.route(MESSAGES, budget_ms=100)
+        settle()
+
+        self.assertEqual(result.model, "gpt-3.5")
+        self.assertFalse(result.hedged)
+        # The slower model can't win, so no backup request is sent to it
+        self.assertEqual(stub.calls, ["gpt-3.5"])
+
+    def test_prefers_best_model_when_it_fits(self):
+        router, stub = make_router({"gpt-4": 20, "gpt-3.5": 10})
+        seed(router, "gpt-4", 20)
+        seed(router, "gpt-3.5", 10)
+
+        result = router.route(MESSAGES, budget_ms=500)
+
+        self.assertEqual(result.model, "gpt-4")
+        self.assertEqual(stub.calls, ["gpt-4"])
+
+    def test_falls_back_when_unmeasured_model_is_at_risk(self):
+        router, stub = make_router({"gpt-4": 1000, "gpt-3.5": 20})
+
+        result = router.route(MESSAGES, budget_ms=300)
+        settle()
+
+        self.assertEqual(result.model, "gpt-3.5")
+        self.assertTrue(result.hedged)
+        self.assertLess(result.latency_ms, 300)
+        self.assertEqual(stub.calls, ["gpt-4", "gpt-3.5"])
+
+    def test_timeout_does_not_lower_estimate(self):
+        router, stub = make_router({"gpt-4": 1000, "gpt-3.5": 20})
+
+        router.route(MESSAGES, budget_ms=200)
+        settle()
+
+        self.assertGreater(router.estimate("gpt-4"), 200)
+        stub.calls.clear()
+        result = router.route(MESSAGES, budget_ms=200)
+        self.assertEqual(result.model, "gpt-3.5")
+        self.assertEqual(stub.calls, ["gpt-3.5"])
+
+    def test_demoted_model_is_retried_once_samples_expire(self):
+        router, stub = make_router({"gpt-4": 1000, "gpt-3.5": 20}, sample_max_age=0.5)
+        for _ in range(3):
+            self.assertEqual(router.route(MESSAGES, budget_ms=200).model, "gpt-3.5")
+        settle()
+
+        stub.latency_ms["gpt-4"] = 20
+        self.assertEqual(router.route(MESSAGES, budget_ms=200).model, "gpt-3.5")
+        time.sleep(0.5)
+
+        self.assertEqual(router.route(MESSAGES, budget_ms=200).model, "gpt-4")
+        self.assertEqual(router.route(MESSAGES, budget_ms=200).model, "gpt-4")
+
+    def test_raises_when_nothing_answers_in_budget(self):
+        router, _ = make_router({"gpt-4": 500})
+
+        # The request times out together with the budget, so either error may surface
+        with self.assertRaises(TimeoutError):
+            router.route(MESSAGES, budget_ms=50)
+
+    def test_fails_over_to_next_model_on_error(self):
+        router, stub = make_router({"gpt-4": 10, "gpt-3.5": 10}, error_rate={"gpt-4": 1.0})
+
+        result = router.route(MESSAGES, budget_ms=500)
+
+        self.assertEqual(result.model, "gpt-3.5")
+        self.assertEqual(stub.calls, ["gpt-4", "gpt-3.5"])
+
+class HedgeTest(unittest.TestCase):
+    def test_hedges_with_faster_model(self):
+        router, stub = make_router({"gpt-4": 500, "gpt-3.5": 20}, hedge_after_ms=50)
+        seed(router, "gpt-4", 500)
+        seed(router, "gpt-3.5", 20)
+
+        result = router.route(MESSAGES)
+        settle()
+
+        self.assertEqual(result.model, "gpt-3.5")
+        self.assertTrue(result.hedged)
+        self.assertGreaterEqual(result.latency_ms, 50)
+        self.assertLess(result.latency_ms, 500)
+
+    def test_does_not_hedge_with_slower_model(self):
+        router, stub = make_router({"gpt-3.5": 100, "gpt-4": 500}, hedge_after_ms=20)
+        seed(router, "gpt-3.5", 100)
+        seed(router, "gpt-4", 500)
+
+        result = router.route(MESSAGES)
+        settle()
+
+        self.assertEqual(result.model, "gpt-3.5")
+        self.assertFalse(result.hedged)
+        self.assertEqual(stub.calls, ["gpt-3.5"])
+
+class CircuitBreakerTest(unittest.TestCase):
+    def make_tripped_router(self, **kwargs):
+        router, stub = make_router(
+            {"gpt-4": 10}, error_rate={"gpt-4": 1.0}, failure_threshold=2, reset_timeout=0.2, **kwargs
+        )
+        for _ in range(2):
+            with self.assertRaises(RuntimeError):
+                router.route(MESSAGES)
+        self.assertEqual(router.breakers["gpt-4"].state, "open")
+        return router, stub
+
+    def test_trips_and_recovers_through_half_open(self):
+        router, stub = self.make_tripped_router()
+
+        with self.assertRaises(CircuitOpenError):
+            router.route(MESSAGES)
+        self.assertEqual(len(stub.calls), 2)
+
+        time.sleep(0.25)
+        self.assertEqual(router.breakers["gpt-4"].state, "half_open")
+        stub.error_rate["gpt-4"] = 0.0
+
+        result = router.route(MESSAGES)
+
+        self.assertEqual(result.model, "gpt-4")
+        self.assertEqual(router.breakers["gpt-4"].state, "closed")
+
+    def test_failed_trial_reopens(self):
+        router, _ = self.make_tripped_router()
+        time.sleep(0.25)
+
+        with self.assertRaises(RuntimeError):
+            router.route(MESSAGES)
+
+        self.assertEqual(router.breakers["gpt-4"].state, "open")
+
+    def test_timed_out_trial_reopens_and_recovers(self):
+        router, stub = self.make_tripped_router()
+        time.sleep(0.25)
+        stub.error_rate["gpt-4"] = 0.0
+        stub.latency_ms["gpt-4"] = 500
+
+        # Either the budget runs out or the timed-out trial is reported first
+        with self.assertRaises(TimeoutError):
+            router.route(MESSAGES, budget_ms=50)
+        time.sleep(0.05)
+        self.assertEqual(router.breakers["gpt-4"].state, "open")
+
+        time.sleep(0.25)
+        stub.latency_ms["gpt-4"] = 10
+        result = router.route(MESSAGES)
+
+        self.assertEqual(result.model, "gpt-4")
+        self.assertEqual(router.breakers["gpt-4"].state, "closed")
+
+    def test_half_open_allows_a_single_trial(self):
+        router, _ = self.make_tripped_router()
+        time.sleep(0.25)
+
+        model, trial = router.claim()
+
+        self.assertEqual(model, "gpt-4")
+        self.assertTrue(trial)
+        with self.assertRaises(CircuitOpenError):
+            router.claim()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,23 +1,97 @@
-from flask import Blueprint, request, jsonify
-from src.models.lead import Lead, Call, SalesPlaybook, db
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from src.models.lead import Lead, Call, SalesPlaybook, FollowUp, db
+from src.services.job_queue import job_queue, wants_async, job_accepted
+from src.services.follow_ups import compile_playbook, run_bulk_follow_ups
+from src.services.voice_pipeline import pipeline_turn
+from src.services.model_router import ModelRouter, StubCompletion, CircuitOpenError, BudgetExceededError
 from datetime import datetime
+import base64
+import click
+import inspect
+import json
 import os
-import openai
-import requests
-from twilio.rest import Client
+import time
 
 voice_agent_bp = Blueprint("voice_agent", __name__)
 
 # Initialize clients (will be configured with environment variables)
 def get_openai_client():
     """Get OpenAI client with API key from environment"""
+    # Heavy SDKs are imported on first use to keep worker start-up fast
+    import openai
+    
     api_key = os.getenv('OPENAI_API_KEY')
     if not api_key:
         raise ValueError("OPENAI_API_KEY environment variable not set")
     return openai.OpenAI(api_key=api_key)
 
+def openai_completion(model, messages, timeout=None, **kwargs):
+    """One chat completion from OpenAI; returns the message text"""
+    response = get_openai_client().chat.completions.create(
+        model=model,
+        messages=messages,
+        timeout=timeout,
+        **kwargs
+    )
+    return response.choices[0].message.content
+
+def model_list(name, default):
+    return [model.strip() for model in os.getenv(name, default).split(",") if model.strip()]
+
+# MODEL_PROVIDER=stub swaps OpenAI for a local stub with injectable latency and errors
+complete = StubCompletion.from_env() if os.getenv("MODEL_PROVIDER") == "stub" else openai_completion
+
+# Conversation turns prefer GPT-4 but fall back to a faster model when the latency budget is at risk
+response_router = ModelRouter(
+    model_list("RESPONSE_MODELS", "gpt-4,gpt-3.5-turbo"),
+    complete,
+    hedge_after_ms=float(os.getenv("RESPONSE_HEDGE_AFTER_MS")) if os.getenv("RESPONSE_HEDGE_AFTER_MS") else None
+)
+sentiment_router = ModelRouter(model_list("SENTIMENT_MODELS", "gpt-3.5-turbo"), complete)
+
+DEFAULT_LATENCY_BUDGET_MS = float(os.getenv("RESPONSE_LATENCY_BUDGET_MS", 2500))
+
+def stream_completion(model, messages, trial=False, timeout=None, **kwargs):
+    """Yield text deltas for one completion, recording latency and failures on the response router.
+    
+    ``model`` must have been claimed with ``response_router.claim`` (``trial``
+    says whether that claim was the circuit breaker's half-open trial).
+    ``timeout`` (seconds) bounds how long the provider may stall.
+    """
+    started = time.monotonic()
+    recorded = False
+    try:
+        if complete is openai_completion:
+            stream = get_openai_client().chat.completions.create(
+                model=model, messages=messages, stream=True, timeout=timeout, **kwargs
+            )
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        else:
+            for word in complete(model, messages, timeout=timeout, **kwargs).split(" "):
+                yield word + " "
+        recorded = True
+        response_router.record_success(model, (time.monotonic() - started) * 1000)
+    except Exception as e:
+        recorded = True
+        response_router.record_error(model, e, (time.monotonic() - started) * 1000, trial)
+        raise
+    finally:
+        if not recorded:
+            # Closed early (client gone, TTS failed): give back a half-open trial instead of holding it forever
+            response_router.breakers[model].record_timeout(trial)
+
+def release_unstarted_stream(text_stream, model, trial):
+    """Give back the claim of a stream that was never started, whose own cleanup therefore never ran"""
+    if inspect.getgeneratorstate(text_stream) == inspect.GEN_CREATED:
+        text_stream.close()
+        response_router.breakers[model].record_timeout(trial)
+
 def get_twilio_client():
     """Get Twilio client with credentials from environment"""
+    from twilio.rest import Client
+    
     account_sid = os.getenv('TWILIO_ACCOUNT_SID')
     auth_token = os.getenv('TWILIO_AUTH_TOKEN')
     if not account_sid or not auth_token:
@@ -35,6 +109,129 @@ def get_elevenlabs_headers():
         "xi-api-key": api_key
     }
 
+def build_conversation_messages(lead, playbook, conversation_history):
+    """Chat messages for the next agent turn: the playbook system prompt plus the history so far"""
+    # Build context for AI
+    system_prompt = f"""
+    You are an expert sales agent calling {lead.name} from {lead.company} in the {lead.industry} industry.
+    
+    Use this sales playbook:
+    - Opening: {playbook.opening_script}
+    - Pain Points: {', '.join(playbook.pain_points)}
+    - Value Props: {', '.join(playbook.value_propositions)}
+    
+    Be natural, conversational, and focus on building rapport. Ask questions to understand their needs.
+    Keep responses concise (1-2 sentences max).
+    """
+    
+    messages = [{"role": "system", "content": system_prompt}]
+    messages.extend(conversation_history)
+    return messages
+
+def fetch_speech(text, voice_id="21m00Tcm4TlvDq8ikWAM"):
+    """Generate speech using ElevenLabs TTS and return the MP3 bytes"""
+    import requests
+    
+    # ElevenLabs TTS API call
+    url = f"https://api.elevenlabs.io/v1/text-to-speech/{voice_id}"
+    
+    payload = {
+        "text": text,
+        "model_id": "eleven_monolingual_v1",
+        "voice_settings": {
+            "stability": 0.5,
+            "similarity_boost": 0.8
+        }
+    }
+    
+    headers = get_elevenlabs_headers()
+    
+    response = requests.post(url, json=payload, headers=headers)
+    
+    if response.status_code != 200:
+        raise RuntimeError("Failed to generate speech")
+    
+    return response.content
+
+class FollowUpError(ValueError):
+    """Raised when no follow-up message can be built for a call"""
+
+@job_queue.task("voice.generate_speech", provider="elevenlabs")
+def synthesize_speech(text, voice_id="21m00Tcm4TlvDq8ikWAM"):
+    """Generate speech using ElevenLabs TTS and describe the audio produced"""
+    audio = fetch_speech(text, voice_id)
+    
+    # In a real implementation, you would save the audio file
+    # and return a URL to access it
+    return {
+        "message": "Speech generated successfully",
+        "audio_size": len(audio),
+        "content_type": "audio/mpeg"
+    }
+
+@job_queue.task("voice.analyze_sentiment", provider="openai")
+def score_sentiment(text):
+    """Analyze sentiment of conversation text using OpenAI"""
+    analysis = sentiment_router.route(
+        [
+            {
+                "role": "system",
+                "content": "You are a sentiment analysis expert. Analyze the sentiment of the given text and return a score between -1 (very negative) and 1 (very positive), along with a brief explanation."
+            },
+            {
+                "role": "user",
+                "content": f"Analyze the sentiment of this conversation: {text}"
+            }
+        ],
+        max_tokens=150
+    ).text
+    
+    # Extract sentiment score (simplified - in production, use more sophisticated parsing)
+    sentiment_score = 0.0
+    if "positive" in analysis.lower():
+        sentiment_score = 0.7
+    elif "negative" in analysis.lower():
+        sentiment_score = -0.3
+    elif "neutral" in analysis.lower():
+        sentiment_score = 0.0
+    
+    return {
+        "sentiment_score": sentiment_score,
+        "analysis": analysis
+    }
+
+@job_queue.task("voice.call_sentiment", provider="openai")
+def score_call_sentiment(call_id):
+    """Post-call work: score the stored transcript and save it on the call"""
+    call = Call.query.get_or_404(call_id)
+    result = score_sentiment(call.transcript)
+    call.sentiment_score = result["sentiment_score"]
+    db.session.commit()
+    return {"call_id": call.id, **result}
+
+@job_queue.task("voice.generate_follow_up", max_attempts=1)
+def build_follow_up(call_id, message_type="email"):
+    """Build a follow-up message for a call from its playbook templates"""
+    call = Call.query.get_or_404(call_id)
+    lead = call.lead
+    playbook = SalesPlaybook.query.filter_by(industry=lead.industry).first()
+    
+    if not playbook or not playbook.follow_up_templates:
+        raise FollowUpError("No follow-up templates available")
+    
+    # Get appropriate template based on outcome and replace placeholders
+    message = compile_playbook(playbook).render(call.outcome, message_type, lead)
+    
+    if message is None:
+        raise FollowUpError("No suitable template found")
+    
+    return {
+        "message": message,
+        "type": message_type,
+        "call": call.to_dict(),
+        "lead": lead.to_dict()
+    }
+
 @voice_agent_bp.route("/voice/initiate-call", methods=["POST"])
 def initiate_call():
     """Initiate a voice call to a lead"""
@@ -55,7 +252,8 @@ def initiate_call():
         # Create call record
         call = Call(
             lead_id=lead_id,
-            status="initiated"
+            status="initiated",
+            campaign=data.get("campaign")
         )
         db.session.add(call)
         db.session.commit()
@@ -136,32 +334,10 @@ def generate_speech():
         if not text:
             return jsonify({"error": "text is required"}), 400
         
-        # ElevenLabs TTS API call
-        url = f"https://api.elevenlabs.io/v1/text-to-speech/{voice_id}"
-        
-        payload = {
-            "text": text,
-            "model_id": "eleven_monolingual_v1",
-            "voice_settings": {
-                "stability": 0.5,
-                "similarity_boost": 0.8
-            }
-        }
-        
-        headers = get_elevenlabs_headers()
-        
-        response = requests.post(url, json=payload, headers=headers)
+        if wants_async(data):
+            return job_accepted(job_queue.enqueue("voice.generate_speech", text=text, voice_id=voice_id))
         
-        if response.status_code == 200:
-            # In a real implementation, you would save the audio file
-            # and return a URL to access it
-            return jsonify({
-                "message": "Speech generated successfully",
-                "audio_size": len(response.content),
-                "content_type": "audio/mpeg"
-            })
-        else:
-            return jsonify({"error": "Failed to generate speech"}), 500
+        return jsonify(synthesize_speech(text, voice_id))
             
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -176,38 +352,10 @@ def analyze_sentiment():
         if not text:
             return jsonify({"error": "text is required"}), 400
         
-        client = get_openai_client()
-        
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are a sentiment analysis expert. Analyze the sentiment of the given text and return a score between -1 (very negative) and 1 (very positive), along with a brief explanation."
-                },
-                {
-                    "role": "user",
-                    "content": f"Analyze the sentiment of this conversation: {text}"
-                }
-            ],
-            max_tokens=150
-        )
-        
-        analysis = response.choices[0].message.content
-        
-        # Extract sentiment score (simplified - in production, use more sophisticated parsing)
-        sentiment_score = 0.0
-        if "positive" in analysis.lower():
-            sentiment_score = 0.7
-        elif "negative" in analysis.lower():
-            sentiment_score = -0.3
-        elif "neutral" in analysis.lower():
-            sentiment_score = 0.0
+        if wants_async(data):
+            return job_accepted(job_queue.enqueue("voice.analyze_sentiment", text=text))
         
-        return jsonify({
-            "sentiment_score": sentiment_score,
-            "analysis": analysis
-        })
+        return jsonify(score_sentiment(text))
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -229,41 +377,104 @@ def generate_response():
         if not playbook:
             return jsonify({"error": f"No playbook found for industry: {lead.industry}"}), 400
         
-        client = get_openai_client()
+        messages = build_conversation_messages(lead, playbook, conversation_history)
         
-        # Build context for AI
-        system_prompt = f"""
-        You are an expert sales agent calling {lead.name} from {lead.company} in the {lead.industry} industry.
-        
-        Use this sales playbook:
-        - Opening: {playbook.opening_script}
-        - Pain Points: {', '.join(playbook.pain_points)}
-        - Value Props: {', '.join(playbook.value_propositions)}
-        
-        Be natural, conversational, and focus on building rapport. Ask questions to understand their needs.
-        Keep responses concise (1-2 sentences max).
-        """
-        
-        messages = [{"role": "system", "content": system_prompt}]
-        messages.extend(conversation_history)
-        
-        response = client.chat.completions.create(
-            model="gpt-4",
-            messages=messages,
+        result = response_router.route(
+            messages,
+            budget_ms=data.get("latency_budget_ms", DEFAULT_LATENCY_BUDGET_MS),
             max_tokens=100,
             temperature=0.7
         )
         
-        ai_response = response.choices[0].message.content
-        
         return jsonify({
-            "response": ai_response,
+            "response": result.text,
+            "model": result.model,
+            "latency_ms": result.latency_ms,
+            "hedged": result.hedged,
             "lead": lead.to_dict()
         })
         
+    except BudgetExceededError as e:
+        return jsonify({"error": str(e)}), 504
+    except CircuitOpenError as e:
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@voice_agent_bp.route("/voice/turn", methods=["POST"])
+def voice_turn():
+    """Generate the agent's next turn and stream its audio sentence by sentence.
+    
+    The completion is streamed and split into sentences; TTS for each
+    sentence starts as soon as it is complete, so the first audio is ready
+    after roughly one sentence plus one TTS call. The body is NDJSON: one
+    {"index", "text", "audio"} line per sentence (audio is base64 MP3), in
+    order, then a final {"done": true, "response": ...} line.
+    """
+    try:
+        data = request.get_json()
+        conversation_history = data.get("conversation_history", [])
+        lead_id = data.get("lead_id")
+        voice_id = data.get("voice_id", "21m00Tcm4TlvDq8ikWAM")  # Default voice
+        
+        if not lead_id:
+            return jsonify({"error": "lead_id is required"}), 400
+        
+        lead = Lead.query.get_or_404(lead_id)
+        playbook = SalesPlaybook.query.filter_by(industry=lead.industry).first()
+        
+        if not playbook:
+            return jsonify({"error": f"No playbook found for industry: {lead.industry}"}), 400
+        
+        # Streaming can't be hedged, but the budget and circuit breakers still pick the model
+        budget_ms = data.get("latency_budget_ms", DEFAULT_LATENCY_BUDGET_MS)
+        model, trial = response_router.claim(budget_ms)
+        text_stream = stream_completion(
+            model,
+            build_conversation_messages(lead, playbook, conversation_history),
+            trial=trial,
+            timeout=budget_ms / 1000,
+            max_tokens=100,
+            temperature=0.7
+        )
+        
+        def generate():
+            started = time.monotonic()
+            sentences = []
+            try:
+                for index, sentence, audio in pipeline_turn(
+                    text_stream,
+                    lambda sentence: fetch_speech(sentence, voice_id),
+                    max_workers=int(os.getenv("TURN_TTS_CONCURRENCY", 2))
+                ):
+                    sentences.append(sentence)
+                    line = {"index": index, "text": sentence, "audio": base64.b64encode(audio).decode("ascii")}
+                    if index == 0:
+                        line["time_to_first_audio_ms"] = round((time.monotonic() - started) * 1000)
+                    yield json.dumps(line) + "\n"
+                
+                yield json.dumps({"done": True, "response": " ".join(sentences), "model": model}) + "\n"
+            except Exception as e:
+                # Headers are already sent, so errors are reported in-band
+                yield json.dumps({"error": str(e)}) + "\n"
+        
+        response = Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+        response.call_on_close(lambda: release_unstarted_stream(text_stream, model, trial))
+        return response
+        
+    except CircuitOpenError as e:
+        return jsonify({"error": str(e)}), 503
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@voice_agent_bp.route("/voice/models", methods=["GET"])
+def get_model_stats():
+    """Get rolling latency and circuit breaker state per model for monitoring"""
+    return jsonify({
+        "response": response_router.stats(),
+        "sentiment": sentiment_router.stats()
+    })
+
 @voice_agent_bp.route("/voice/end-call", methods=["POST"])
 def end_call():
     """End a call and update records"""
@@ -307,11 +518,17 @@ def end_call():
         
         db.session.commit()
         
-        return jsonify({
+        result = {
             "message": "Call ended successfully",
             "call": call.to_dict(),
             "lead": lead.to_dict()
-        })
+        }
+        
+        # Score the transcript in the background instead of holding the request
+        if transcript and sentiment_score is None:
+            result["sentiment_job_id"] = job_queue.enqueue("voice.call_sentiment", call_id=call.id).id
+        
+        return jsonify(result)
         
     except Exception as e:
         db.session.rollback()
@@ -347,37 +564,70 @@ def generate_follow_up():
         if not call_id:
             return jsonify({"error": "call_id is required"}), 400
         
-        call = Call.query.get_or_404(call_id)
-        lead = call.lead
-        playbook = SalesPlaybook.query.filter_by(industry=lead.industry).first()
-        
-        if not playbook or not playbook.follow_up_templates:
-            return jsonify({"error": "No follow-up templates available"}), 400
-        
-        # Get appropriate template based on outcome
-        templates = playbook.follow_up_templates
-        template_key = f"{call.outcome}_{message_type}"
+        if wants_async(data):
+            return job_accepted(job_queue.enqueue("voice.generate_follow_up", call_id=call_id, message_type=message_type))
         
-        if template_key not in templates:
-            template_key = f"default_{message_type}"
+        return jsonify(build_follow_up(call_id, message_type))
         
-        if template_key not in templates:
-            return jsonify({"error": "No suitable template found"}), 400
+    except FollowUpError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@voice_agent_bp.route("/voice/follow-ups/bulk", methods=["POST"])
+def bulk_follow_ups():
+    """Generate and dispatch follow-ups for all calls completed in a time window or campaign"""
+    try:
+        data = request.get_json()
+        since = data.get("since")
+        campaign = data.get("campaign")
+        
+        if not since and not campaign:
+            return jsonify({"error": "since or campaign is required"}), 400
+        
+        options = {
+            "since": since,
+            "until": data.get("until"),
+            "campaign": campaign,
+            "channels": data.get("channels", ["email"]),
+            "dispatch": data.get("dispatch", True)
+        }
         
-        template = templates[template_key]
+        if any(channel not in ("email", "sms") for channel in options["channels"]):
+            return jsonify({"error": "channels must be email and/or sms"}), 400
         
-        # Replace placeholders
-        message = template.replace("{lead_name}", lead.name)
-        message = message.replace("{company}", lead.company or "your business")
-        message = message.replace("{agent_name}", "Sarah")  # Could be configurable
+        # Nightly runs cover tens of thousands of calls, so this is a background job unless asked otherwise
+        if data.get("async", True):
+            return job_accepted(job_queue.enqueue("voice.bulk_follow_up", **options))
         
-        return jsonify({
-            "message": message,
-            "type": message_type,
-            "call": call.to_dict(),
-            "lead": lead.to_dict()
-        })
+        return jsonify(run_bulk_follow_ups(**options))
         
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 500
+
+@voice_agent_bp.route("/voice/calls/<int:call_id>/follow-ups", methods=["GET"])
+def get_call_follow_ups(call_id):
+    """Get follow-ups generated for a call with their delivery status"""
+    try:
+        follow_ups = FollowUp.query.filter_by(call_id=call_id).order_by(FollowUp.created_at).all()
+        return jsonify([follow_up.to_dict() for follow_up in follow_ups])
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@voice_agent_bp.cli.command("send-follow-ups")
+@click.option("--since", help="ISO timestamp; calls completed at or after this time")
+@click.option("--until", help="ISO timestamp; calls completed before this time")
+@click.option("--campaign", help="Only calls in this campaign")
+@click.option("--channel", "channels", multiple=True, default=["email"], type=click.Choice(["email", "sms"]))
+@click.option("--no-dispatch", is_flag=True, help="Generate follow-ups without sending them")
+def send_follow_ups_command(since, until, campaign, channels, no_dispatch):
+    """Generate and send follow-ups in one pass (e.g. from a nightly cron)"""
+    summary = run_bulk_follow_ups(
+        since=since,
+        until=until,
+        campaign=campaign,
+        channels=list(channels),
+        dispatch=not no_dispatch
+    )
+    click.echo(summary)
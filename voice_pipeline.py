@@ -0,0 +1,84 @@
+from concurrent.futures import ThreadPoolExecutor
+import queue
+import re
+import threading
+
+# Words whose trailing period does not end a sentence
+ABBREVIATIONS = {"mr", "mrs", "ms", "dr", "prof", "sr", "jr", "st", "vs", "etc", "inc", "ltd", "co", "e.g", "i.e", "approx"}
+
+SENTENCE_END_RE = re.compile(r"[.!?…]+[\"')\]]*\s+")
+
+class SentenceSegmenter:
+    """Split streamed text into sentences as soon as each one is complete.
+
+    Text is fed in arbitrary chunks (LLM deltas); ``feed`` returns the
+    sentences completed so far and ``flush`` returns whatever is left once the
+    stream ends. Fragments shorter than ``min_chars`` are held back and joined
+    with the next sentence, since very short TTS requests sound choppy.
+    """
+
+    def __init__(self, min_chars=12):
+        self.min_chars = min_chars
+        self.buffer = ""
+
+    def feed(self, text):
+        self.buffer += text
+        sentences = []
+        start = 0
+        for match in SENTENCE_END_RE.finditer(self.buffer):
+            candidate = self.buffer[start:match.end()].strip()
+            last_word = candidate.rstrip(".!?…\"')]").rsplit(None, 1)[-1].lower() if candidate else ""
+            if last_word in ABBREVIATIONS or len(candidate) < self.min_chars:
+                continue
+            sentences.append(candidate)
+            start = match.end()
+        self.buffer = self.buffer[start:]
+        return sentences
+
+    def flush(self):
+        rest, self.buffer = self.buffer.strip(), ""
+        return [rest] if rest else []
+
+_DONE = object()
+
+def pipeline_turn(text_stream, synthesize, max_workers=2, min_chars=12):
+    """Overlap LLM generation with TTS, yielding (index, sentence, audio) in order.
+
+    ``text_stream`` yields text deltas and ``synthesize`` turns one sentence
+    into audio bytes. A producer thread consumes the stream and submits each
+    sentence to a TTS pool of ``max_workers`` the moment it is complete, so the
+    first sentence is being spoken while later ones are still generated.
+    Errors from either side are re-raised in the caller.
+    """
+    futures = queue.Queue()
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="turn-tts")
+
+    def produce():
+        segmenter = SentenceSegmenter(min_chars=min_chars)
+        try:
+            for delta in text_stream:
+                for sentence in segmenter.feed(delta):
+                    futures.put((sentence, executor.submit(synthesize, sentence)))
+            for sentence in segmenter.flush():
+                futures.put((sentence, executor.submit(synthesize, sentence)))
+            futures.put(_DONE)
+        except Exception as e:
+            futures.put(e)
+
+    producer = threading.Thread(target=produce, name="turn-llm", daemon=True)
+    producer.start()
+
+    try:
+        index = 0
+        while True:
+            item = futures.get()
+            if item is _DONE:
+                break
+            if isinstance(item, Exception):
+                raise item
+            sentence, future = item
+            yield index, sentence, future.result()
+            index += 1
+    finally:
+        # If the client disconnects, don't start TTS for sentences nobody will hear
+        executor.shutdown(wait=False, cancel_futures=True)